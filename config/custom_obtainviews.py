@@ -8,10 +8,13 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from texnomart.revocation import revoke
 from texnomart.serializers import UserRegisterSerializer, UserLoginSerializer
+from texnomart.throttling import LoginAttemptsMixin, RegisterThrottle
 
 
-class CustomAuthToken(ObtainAuthToken):
+class CustomAuthToken(LoginAttemptsMixin, ObtainAuthToken):
+
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
@@ -33,7 +36,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
-class CustomTokenObtainPairView(TokenObtainPairView):
+class CustomTokenObtainPairView(LoginAttemptsMixin, TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
@@ -42,7 +45,7 @@ class LogoutView(APIView):
         try:
             refresh_token = request.data.get('refresh')
             refresh_token = RefreshToken(refresh_token)
-            refresh_token.blacklist()
+            revoke(refresh_token)
             return Response({
                 'Details': 'Successfully logged out.',
                 'refresh_token': str(refresh_token)
@@ -56,6 +59,7 @@ class LogoutView(APIView):
 
 class RegisterView(CreateAPIView):
     serializer_class = UserRegisterSerializer
+    throttle_classes = [RegisterThrottle]
 
     def perform_create(self, serializer):
         user = serializer.save()
@@ -72,7 +76,7 @@ class RegisterView(CreateAPIView):
         return response
 
 
-class LoginView(GenericAPIView):
+class LoginView(LoginAttemptsMixin, GenericAPIView):
     serializer_class = UserLoginSerializer
 
     def post(self, request, *args, **kwargs):
@@ -0,0 +1,59 @@
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA_DB_ALIAS = 'replica'
+
+# GET-only views whose reads may be served from the replica. The replica lags until the next
+# sync_read_replica, so views that fill the shared caches (product lists, categories, details,
+# attributes, the suggest index) or show the user's own likes stay on the primary: a refill
+# from the replica would outlive the invalidation that followed the write. Recommendations
+# are computed offline and tolerate the lag.
+CATALOG_READ_URL_NAMES = {'product-related'}
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if read_from_replica.get() and REPLICA_DB_ALIAS in settings.DATABASES:
+            return REPLICA_DB_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
+
+
+class ReadReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            read_from_replica.set(False)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            read_from_replica.set(False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in ('GET', 'HEAD') and request.resolver_match.url_name in CATALOG_READ_URL_NAMES:
+            read_from_replica.set(True)
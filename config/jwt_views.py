@@ -1,8 +1,12 @@
 from typing import Dict, Any
 
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from texnomart.revocation import is_revoked
+from texnomart.throttling import LoginAttemptsMixin
+
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
@@ -22,5 +26,14 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
-class MyTokenObtainPairView(TokenObtainPairView):
+class MyTokenObtainPairView(LoginAttemptsMixin, TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+
+
+class RevocationCheckingTokenRefreshSerializer(TokenRefreshSerializer):
+    # Refuses refresh tokens revoked by LogoutView. Access tokens already issued stay valid
+    # until they expire (ACCESS_TOKEN_LIFETIME).
+    def validate(self, attrs):
+        if is_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token has been revoked.')
+        return super().validate(attrs)
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.1/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'texnomart.metrics.MetricsMiddleware',
+    'texnomart.querycheck.QueryInspectionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'config.db_router.ReadReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -77,13 +81,45 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# WAL lets catalog readers keep going while a writer holds the lock; busy_timeout
+# makes writers queue instead of failing with "database is locked", and IMMEDIATE
+# transactions take the write lock up front.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+        },
     }
 }
 
+# Optional read replica for the catalog views listed in config.db_router, refreshed from
+# the primary with `manage.py sync_read_replica`. Off unless TEXNOMART_REPLICA_DB is set.
+REPLICA_DB_NAME = os.environ.get('TEXNOMART_REPLICA_DB')
+if REPLICA_DB_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': REPLICA_DB_NAME,
+        'OPTIONS': {
+            'init_command': 'PRAGMA query_only=1;PRAGMA busy_timeout=20000;PRAGMA mmap_size=268435456',
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['config.db_router.ReadReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,6 +157,20 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored under their content hash, so identical images share one file.
+STORAGES = {
+    'default': {'BACKEND': 'texnomart.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Media delivery (texnomart.media.serve_media). Hashed names are served as immutable, others
+# are cached for MEDIA_CACHE_SECONDS. Set TEXNOMART_MEDIA_ACCEL_PREFIX to an nginx internal
+# location aliasing MEDIA_ROOT (e.g. /protected-media/) to answer with X-Accel-Redirect, or
+# TEXNOMART_MEDIA_SENDFILE_HEADER=X-Sendfile for Apache/lighttpd, so the proxy sends the bytes.
+MEDIA_CACHE_SECONDS = 60 * 60
+MEDIA_ACCEL_REDIRECT_PREFIX = os.environ.get('TEXNOMART_MEDIA_ACCEL_PREFIX', '')
+MEDIA_SENDFILE_HEADER = os.environ.get('TEXNOMART_MEDIA_SENDFILE_HEADER', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -128,20 +178,67 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'texnomart.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'texnomart.throttling.SearchThrottle',
+        'texnomart.throttling.WriteThrottle',
+    ],
+    # Reverse proxies in front of the app. Throttles take the client IP this many hops back in
+    # X-Forwarded-For; 0 uses REMOTE_ADDR, so clients cannot pick their own address.
+    'NUM_PROXIES': int(os.environ.get('TEXNOMART_NUM_PROXIES', '0')),
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'register': '5/hour',
+        'search': '60/min',
+        'write': '60/min',
+    },
 }
 
+# texnomart.throttling budgets (DEFAULT_THROTTLE_RATES) apply per client IP and per user.
+# The counters live in the 'throttle' cache; locmem keeps a budget per worker process, so
+# point it at Redis or Memcached to share budgets when running several workers. WEB_WORKERS
+# (gunicorn's WEB_CONCURRENCY) lets the texnomart.E001 check refuse locmem with more than one.
+THROTTLE_ENABLED = os.environ.get('TEXNOMART_THROTTLE_ENABLED', '1') == '1'
+WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+# The default cache holds one detail entry per product (product detail and batch views), two
+# per category page, the list payloads and the resolved JWT users. Django's stock MAX_ENTRIES
+# of 300 culls a random third of them long before a catalog is warm; warm_cache fills at most
+# half of MAX_ENTRIES and leaves the rest to traffic.
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
         "LOCATION": BASE_DIR / 'cache',
-    }
+        "OPTIONS": {"MAX_ENTRIES": 20_000},
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "throttle",
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    },
 }
 
+# Per-URL latency, query, cache and serializer metrics served at /metrics/.
+# When off, the middleware removes itself and nothing is recorded.
+METRICS_ENABLED = os.environ.get('TEXNOMART_METRICS_ENABLED') == '1'
+
+# Development query inspection: logs SQL shapes repeated N_PLUS_ONE_THRESHOLD times
+# in one request and queries slower than SLOW_QUERY_MS with their EXPLAIN plan.
+QUERY_INSPECTION_ENABLED = DEBUG
+N_PLUS_ONE_THRESHOLD = 5
+SLOW_QUERY_MS = 100
+
+# In-process autocomplete index behind suggest/. Each worker keeps at most
+# SUGGEST_MAX_ENTRIES prefix entries (the most popular names win) and rebuilds
+# the whole index after SUGGEST_REFRESH_SECONDS to pick up changes made elsewhere.
+SUGGEST_MAX_ENTRIES = 200_000
+SUGGEST_REFRESH_SECONDS = 600
+SUGGEST_ATTRIBUTE_VALUES = 1000
+
 INTERNAL_IPS = [
     # ...
     "127.0.0.1",
@@ -156,6 +253,17 @@ EMAIL_HOST_USER = 'ibrokhim1155@gmail.com'
 EMAIL_HOST_PASSWORD = 'hmbq wtbv mfpm zicm'
 EMAIL_DEFAULT_SENDER = EMAIL_HOST_USER
 
+# texnomart.authentication keeps resolved users in each worker for AUTH_USER_LOCAL_SECONDS
+# and in the shared cache for AUTH_USER_SHARED_SECONDS. Saving a user clears both in the
+# saving process; other workers pick the change up within AUTH_USER_LOCAL_SECONDS.
+AUTH_USER_LOCAL_SECONDS = 30
+AUTH_USER_SHARED_SECONDS = 60 * 5
+
+# texnomart.revocation deletes up to REVOKED_TOKEN_PRUNE_BATCH expired revocations every
+# REVOKED_TOKEN_PRUNE_EVERY logouts in each worker, so the table needs no scheduled cleanup.
+REVOKED_TOKEN_PRUNE_EVERY = 100
+REVOKED_TOKEN_PRUNE_BATCH = 1000
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -164,7 +272,7 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": False,
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "config.jwt_views.RevocationCheckingTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -15,13 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from config.jwt_views import MyTokenObtainPairView
 from config import settings
 from config import custom_obtainviews
+from texnomart.media import serve_media
+from texnomart.metrics import metrics_view
 
 
 urlpatterns = [
@@ -30,8 +31,10 @@ urlpatterns = [
                   path('api-token-auth/', custom_obtainviews.CustomAuthToken.as_view()),
                   path('api/token/access/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
                   path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+                  path('metrics/', metrics_view, name='metrics'),
+                  re_path(rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.+)$", serve_media, name='media'),
 
-              ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+              ]
 if settings.DEBUG:
     import debug_toolbar
 
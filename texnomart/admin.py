@@ -1,21 +1,86 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from django.utils.safestring import mark_safe
-from .models import Product, Category, Image, Comment, Attribute, AttributeValue, AttributeKey
+
+from .attributes import normalize
+from .caching import invalidate_catalog
+from .categories import recount_products
+from .deletion import delete_categories, delete_products
+from .models import Product, Category, Image, Comment, Attribute, AttributeValue, AttributeKey, Campaign
+from .paginators import ApproximateCountPaginator
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+class ProductActionForm(ActionForm):
+    discount = forms.FloatField(required=False, min_value=0, max_value=100, label='Discount %')
+    price_change = forms.FloatField(required=False, min_value=-99, label='Price change %')
+    category = forms.ModelChoiceField(Category.objects.order_by('title'), required=False, label='Move to')
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price')
+class ProductAdmin(ScalableAdmin):
+    list_display = ('name', 'price', 'discount', 'category', 'created_at')
+    list_select_related = ('category',)
+    list_filter = ('category', 'created_at')
+    # istartswith, served by product_name_prefix_idx (migration 0012); a plain index on name is not used.
+    search_fields = ('^name',)
+    autocomplete_fields = ('category', 'user_likes')
     exclude = ('slug',)
+    action_form = ProductActionForm
+    actions = ['set_discount', 'change_price', 'move_to_category']
+
+    def bulk_update(self, request, queryset, field, build_update):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid() or form.cleaned_data.get(field) is None:
+            self.message_user(request, f'Fill in "{form[field].label}" before running this action.', messages.ERROR)
+            return
+        with transaction.atomic():
+            product_ids = list(queryset.values_list('id', flat=True))
+            category_ids = set(queryset.values_list('category_id', flat=True))
+            updated = queryset.update(updated_at=timezone.now(), **build_update(form.cleaned_data[field]))
+            # update() skips the signals that keep category totals in step.
+            category_ids.update(Product.objects.filter(pk__in=product_ids).values_list('category_id', flat=True))
+            recount_products(category_ids)
+            transaction.on_commit(lambda: invalidate_catalog(product_ids))
+        self.message_user(request, f'{updated} products updated.', messages.SUCCESS)
+
+    def delete_queryset(self, request, queryset):
+        delete_products(queryset.values_list('id', flat=True))
+
+    @admin.action(description='Set discount of selected products')
+    def set_discount(self, request, queryset):
+        self.bulk_update(request, queryset, 'discount', lambda discount: {'discount': discount})
+
+    @admin.action(description='Change price of selected products by %%')
+    def change_price(self, request, queryset):
+        self.bulk_update(request, queryset, 'price_change', lambda percent: {'price': F('price') * (1 + percent / 100)})
+
+    @admin.action(description='Move selected products to category')
+    def move_to_category(self, request, queryset):
+        self.bulk_update(request, queryset, 'category', lambda category: {'category': category})
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    fields = ['title', 'image', 'get_image']
-    list_display = ['title', 'get_image', 'slug']
+    fields = ['title', 'parent', 'image', 'get_image']
+    list_display = ['title', 'get_image', 'slug', 'parent', 'product_count']
+    list_select_related = ['parent']
     search_fields = ['title']
+    autocomplete_fields = ['parent']
     readonly_fields = ['get_image']
 
+    def delete_queryset(self, request, queryset):
+        delete_categories(list(queryset.values_list('id', flat=True)))
+
     def get_image(self, obj):
         if obj.image:
             return mark_safe(f"<img src='{obj.image.url}' width='50' height='50'>")
@@ -25,13 +90,19 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Image)
-class ImageAdmin(admin.ModelAdmin):
+class ImageAdmin(ScalableAdmin):
     list_display = ['is_primary', 'image', 'product']
+    list_select_related = ['product']
+    list_filter = ['is_primary']
+    autocomplete_fields = ['product']
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ['rating', 'product', 'user', 'content']
+    list_select_related = ['product', 'user']
+    list_filter = ['rating']
+    autocomplete_fields = ['product']
     readonly_fields = ['user']
 
     def save_model(self, request, obj, form, change):
@@ -40,6 +111,46 @@ class CommentAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
-admin.site.register(Attribute)
-admin.site.register(AttributeValue)
-admin.site.register(AttributeKey)
+@admin.register(Attribute)
+class AttributeAdmin(ScalableAdmin):
+    list_display = ['product', 'key', 'value']
+    list_select_related = ['product', 'key', 'value']
+    list_filter = ['key']
+    autocomplete_fields = ['product', 'key', 'value']
+
+
+class AttributeValueForm(forms.ModelForm):
+    def clean_value(self):
+        return normalize(self.cleaned_data['value'])
+
+
+class AttributeKeyForm(forms.ModelForm):
+    def clean_key(self):
+        return normalize(self.cleaned_data['key'])
+
+
+@admin.register(AttributeValue)
+class AttributeValueAdmin(admin.ModelAdmin):
+    form = AttributeValueForm
+    search_fields = ['value']
+
+
+@admin.register(AttributeKey)
+class AttributeKeyAdmin(admin.ModelAdmin):
+    form = AttributeKeyForm
+    search_fields = ['key']
+
+
+@admin.register(Campaign)
+class CampaignAdmin(admin.ModelAdmin):
+    list_display = ['name', 'discount', 'category', 'starts_at', 'ends_at', 'status']
+    list_select_related = ['category']
+    list_filter = ['status']
+    autocomplete_fields = ['category', 'products']
+    readonly_fields = ['status']
+
+    def get_readonly_fields(self, request, obj=None):
+        # end_campaign restores discounts by matching the campaign's own discount and targets.
+        if obj and obj.status != Campaign.Status.SCHEDULED:
+            return ['name', 'discount', 'category', 'products', 'starts_at', 'status']
+        return self.readonly_fields
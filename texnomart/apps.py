@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class TexnomartConfig(AppConfig):
@@ -7,3 +8,5 @@ class TexnomartConfig(AppConfig):
 
     def ready(self):
         import texnomart.signals
+        from texnomart.throttling import check_throttle_cache
+        checks.register(check_throttle_cache)
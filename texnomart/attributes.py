@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from texnomart.models import Product, Attribute, AttributeKey, AttributeValue
+
+
+def normalize(text):
+    # Every AttributeKey.key and AttributeValue.value is stored like this: the interner below, the
+    # admin forms and the serializers all pass text through here, so "Color " never sits next to "Color".
+    return ' '.join(str(text).split())
+
+
+class AttributeInterner:
+    # Key and value ids for one batch of writes (a request, a command run): each distinct key or
+    # value costs one query per batch. Nothing outlives the batch, so an id from a rolled-back
+    # get_or_create or for a row deleted meanwhile is never reused by a later one.
+    def __init__(self):
+        self.key_ids = {}
+        self.value_ids = {}
+
+    def key_id(self, name):
+        name = normalize(name)
+        if name not in self.key_ids:
+            self.key_ids[name] = AttributeKey.objects.get_or_create(key=name)[0].pk
+        return self.key_ids[name]
+
+    def value_id(self, value):
+        value = normalize(value)
+        if value not in self.value_ids:
+            self.value_ids[value] = AttributeValue.objects.get_or_create(value=value)[0].pk
+        return self.value_ids[value]
+
+
+def attributes_data(product_ids):
+    data = defaultdict(dict)
+    rows = Attribute.objects.filter(product_id__in=product_ids).order_by('id').values_list(
+        'product_id', 'key__key', 'value__value'
+    )
+    for product_id, key, value in rows:
+        data[product_id][key] = value
+    return data
+
+
+def refresh_attributes_data(product_ids, batch_size=500):
+    # Keeps Product.attributes_data a copy of the Attribute rows, so reads need no join.
+    product_ids = list(product_ids)
+    for offset in range(0, len(product_ids), batch_size):
+        batch = product_ids[offset:offset + batch_size]
+        data = attributes_data(batch)
+        Product.objects.bulk_update(
+            [Product(pk=product_id, attributes_data=data.get(product_id, {})) for product_id in batch],
+            ['attributes_data'],
+        )
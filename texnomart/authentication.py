@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+# Bump when USER_FIELDS changes so workers running older code never read the new entries.
+USER_CACHE_VERSION = 1
+LOCAL_CACHE_SIZE = 10_000
+# The password hash is left out of every cache; User.from_db() defers it, so it is only
+# loaded (and only saved back) if someone touches it.
+USER_FIELDS = [field.attname for field in get_user_model()._meta.concrete_fields if field.attname != 'password']
+MISSING = object()
+
+
+def user_generation_key(user_id):
+    return f'auth_user_generation_{user_id}'
+
+
+def user_cache_key(user_id, generation):
+    # forget_user() bumps the generation, so an entry written by a request that read the user
+    # before the change lands under a key nobody reads any more.
+    return f'auth_user_{user_id}_{generation}'
+
+
+class LocalUserCache:
+    # Per-process LRU in front of the shared cache. Entries live AUTH_USER_LOCAL_SECONDS, which
+    # bounds how long another worker keeps serving a user after they are saved or deactivated.
+    def __init__(self, max_size=LOCAL_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Counts discards, so a load that started before one does not store what it read.
+        self.discards = 0
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return MISSING
+            expires_at, values = entry
+            if expires_at < time.monotonic():
+                del self.entries[user_id]
+                return MISSING
+            self.entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values, discards):
+        with self.lock:
+            if discards != self.discards:
+                return
+            self.entries[user_id] = (time.monotonic() + settings.AUTH_USER_LOCAL_SECONDS, values)
+            self.entries.move_to_end(user_id)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.discards += 1
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def build_user(values):
+    return get_user_model().from_db('default', USER_FIELDS, values)
+
+
+def user_generation(user_id):
+    # A missing generation (never set, or culled) starts at a new clock reading, so no entry
+    # cached under an earlier generation can be read again.
+    key = user_generation_key(user_id)
+    generation = cache.get(key, version=USER_CACHE_VERSION)
+    if generation is None:
+        generation = time.time_ns()
+        cache.add(key, generation, None, version=USER_CACHE_VERSION)
+        generation = cache.get(key, generation, version=USER_CACHE_VERSION)
+    return generation
+
+
+def load_user_values(user_id):
+    # None is cached too, so a token for a deleted user does not hit the database each time.
+    discards = local_users.discards
+    values = local_users.get(user_id)
+    if values is MISSING:
+        key = user_cache_key(user_id, user_generation(user_id))
+        values = cache.get(key, MISSING, version=USER_CACHE_VERSION)
+        if values is MISSING:
+            values = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: user_id}
+            ).values_list(*USER_FIELDS).first()
+            cache.set(key, values, settings.AUTH_USER_SHARED_SECONDS, version=USER_CACHE_VERSION)
+        local_users.set(user_id, values, discards)
+    return values
+
+
+def forget_user(user_id):
+    local_users.discard(user_id)
+    # A fresh clock reading rather than incr(): the default cache culls entries, and a generation
+    # counted up again from 0 after a cull could match an old entry that is still cached.
+    cache.set(user_generation_key(user_id), time.time_ns(), None, version=USER_CACHE_VERSION)
+
+
+def token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+
+
+def active_user(values):
+    if values is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    user = build_user(values)
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    # JWTAuthentication without the per-request User query: users come from the local cache,
+    # then the shared cache, then the database. The User signals in texnomart.signals drop the
+    # entries when a user is saved or deleted.
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Needs the password hash, which is never cached.
+            return super().get_user(validated_token)
+        return active_user(load_user_values(token_user_id(validated_token)))
+
+
+IS_ACTIVE_INDEX = USER_FIELDS.index('is_active')
+
+
+class TokenUserAuthentication(CachedJWTAuthentication):
+    # For read-only views that only need the user id: safe requests get a TokenUser built from
+    # the claims instead of a User instance. The cached values are still checked, so a deleted or
+    # deactivated user loses read access as soon as forget_user() reaches this worker; writes
+    # still go through the cached User.
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        values = load_user_values(token_user_id(validated_token))
+        if values is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not values[IS_ACTIVE_INDEX]:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return TokenUser(validated_token), validated_token
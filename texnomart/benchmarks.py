@@ -0,0 +1,31 @@
+import statistics
+
+BENCH_HOST = 'bench.texnomart.local'
+BENCH_CLIENT_IP = '10.0.0.1'
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    if len(latencies) < 2:
+        value = round(latencies[0] * 1000, 3) if latencies else None
+        return {'p50_ms': value, 'p95_ms': value, 'p99_ms': value}
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50_ms': round(quantiles[49] * 1000, 3),
+        'p95_ms': round(quantiles[94] * 1000, 3),
+        'p99_ms': round(quantiles[98] * 1000, 3),
+    }
+
+
+def bench_settings(settings):
+    return {
+        'DEBUG': False,
+        'QUERY_INSPECTION_ENABLED': False,
+        'ALLOWED_HOSTS': [BENCH_HOST],
+        'MIDDLEWARE': [middleware for middleware in settings.MIDDLEWARE if not middleware.startswith('debug_toolbar')],
+        'CACHES': {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle'},
+        },
+        'THROTTLE_ENABLED': False,
+    }
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from texnomart.models import Category, CategoryClosure
+
+PRODUCT_DETAIL_TIMEOUT = 60 * 15
+PRODUCT_LIST_CACHE_KEYS = ['all_products', 'all_products_payload', 'category_list', 'category_list_payload']
+
+
+def product_detail_cache_key(product_id):
+    return f'product_detail_{product_id}'
+
+
+def category_products_cache_keys(slug):
+    return [f'category_products_{slug}', f'category_products_payload_{slug}']
+
+
+def absolute_image_urls(data, request):
+    # Cached detail payloads hold relative media paths; the host and scheme come from each request.
+    return dict(data, images=[request.build_absolute_uri(url) for url in data['images']])
+
+
+def absolute_product_image_urls(items, request):
+    # The async list payloads are cached the same way, one relative 'image' per product.
+    return [dict(item, image=request.build_absolute_uri(item['image']) if item['image'] else None)
+            for item in items]
+
+
+def absolute_category_image_urls(nodes, request):
+    return [dict(node, children=absolute_category_image_urls(node['children'], request),
+                 **{field: request.build_absolute_uri(node[field]) if node[field] else None
+                    for field in ('image', 'image_of_category')})
+            for node in nodes]
+
+
+def invalidate_product_detail(*product_ids):
+    cache.delete_many([product_detail_cache_key(product_id) for product_id in product_ids])
+
+
+def invalidate_catalog(product_ids=(), category_slugs=None):
+    if category_slugs is None:
+        category_slugs = Category.objects.values_list('slug', flat=True)
+    keys = list(PRODUCT_LIST_CACHE_KEYS)
+    for slug in category_slugs:
+        keys += category_products_cache_keys(slug)
+    keys += [product_detail_cache_key(product_id) for product_id in product_ids]
+    cache.delete_many(keys)
+
+
+def invalidate_product_lists(category_ids):
+    # The product index, the category list (its totals) and the pages of every category above,
+    # whose subtree listings include the product. The keys are collected now, while the closure
+    # rows still exist, and deleted once the transaction commits so no reader refills them early.
+    slugs = list(Category.objects.filter(pk__in=CategoryClosure.objects.filter(
+        descendant_id__in=category_ids).values('ancestor_id')).values_list('slug', flat=True))
+    keys = list(PRODUCT_LIST_CACHE_KEYS)
+    for slug in slugs:
+        keys += category_products_cache_keys(slug)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,88 @@
+import time
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from texnomart.caching import invalidate_catalog
+from texnomart.models import Campaign, CampaignProduct, Product
+
+
+def target_products(campaign):
+    products = Product.objects.all()
+    if campaign.category_id:
+        products = products.filter(category__ancestor_links__ancestor_id=campaign.category_id)
+    if campaign.products.exists():
+        products = products.filter(campaigns=campaign)
+    # A product already held by a running campaign stays with it.
+    return products.exclude(campaign_snapshots__campaign__status=Campaign.Status.ACTIVE)
+
+
+def snapshot(campaign):
+    # INSERT ... SELECT, so the previous discounts never travel through Python.
+    sql, params = target_products(campaign).order_by().values('id', 'discount').query.sql_with_params()
+    table = connection.ops.quote_name(CampaignProduct._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (campaign_id, product_id, previous_discount) '
+            f'SELECT %s, targets.id, targets.discount FROM ({sql}) AS targets',
+            [campaign.pk, *params],
+        )
+        return cursor.rowcount
+
+
+def campaign_product_ids(campaign):
+    return list(CampaignProduct.objects.filter(campaign=campaign).values_list('product_id', flat=True))
+
+
+def start_campaign(campaign):
+    # The status guard makes a second scheduler running at the same time skip the campaign.
+    with transaction.atomic():
+        if not Campaign.objects.filter(pk=campaign.pk, status=Campaign.Status.SCHEDULED).update(
+                status=Campaign.Status.ACTIVE, updated_at=timezone.now()):
+            return None
+        snapshot(campaign)
+        updated = Product.objects.filter(campaign_snapshots__campaign=campaign).update(
+            discount=campaign.discount, updated_at=timezone.now()
+        )
+        product_ids = campaign_product_ids(campaign)
+        transaction.on_commit(lambda: invalidate_catalog(product_ids))
+    return updated
+
+
+def end_campaign(campaign):
+    # Discounts edited by hand during the campaign are kept; the rest get their old value back.
+    with transaction.atomic():
+        if not Campaign.objects.filter(pk=campaign.pk, status=Campaign.Status.ACTIVE).update(
+                status=Campaign.Status.FINISHED, updated_at=timezone.now()):
+            return None
+        previous = CampaignProduct.objects.filter(campaign=campaign, product=OuterRef('pk'))
+        updated = Product.objects.filter(campaign_snapshots__campaign=campaign, discount=campaign.discount).update(
+            discount=Subquery(previous.values('previous_discount')[:1]), updated_at=timezone.now()
+        )
+        product_ids = campaign_product_ids(campaign)
+        CampaignProduct.objects.filter(campaign=campaign).delete()
+        transaction.on_commit(lambda: invalidate_catalog(product_ids))
+    return updated
+
+
+def run_due_campaigns(now=None, log=lambda message: None):
+    # Ends come first so a product moving from one campaign to the next is free to be picked up.
+    # Category totals sum list prices, which campaigns never touch; the discounted price and
+    # monthly payment only exist in the cached payloads, which are invalidated once per campaign.
+    now = now or timezone.now()
+    for campaign in Campaign.objects.filter(status=Campaign.Status.ACTIVE, ends_at__lte=now).order_by('ends_at'):
+        start = time.perf_counter()
+        updated = end_campaign(campaign)
+        if updated is not None:
+            log(f'Ended "{campaign}": {updated} products restored in {time.perf_counter() - start:.2f}s')
+    missed = Campaign.objects.filter(status=Campaign.Status.SCHEDULED, ends_at__lte=now)
+    for campaign in missed.order_by('starts_at'):
+        log(f'Skipped "{campaign}": it ended before it could start')
+    missed.update(status=Campaign.Status.FINISHED, updated_at=now)
+    for campaign in Campaign.objects.filter(status=Campaign.Status.SCHEDULED, starts_at__lte=now).order_by('starts_at'):
+        start = time.perf_counter()
+        updated = start_campaign(campaign)
+        if updated is not None:
+            log(f'Started "{campaign}": {updated} products at {campaign.discount:g}% '
+                f'in {time.perf_counter() - start:.2f}s')
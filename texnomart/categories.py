@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Count, Sum, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from texnomart.models import Category, CategoryClosure, Product
+
+
+def link_category(category):
+    # A new category is its own depth-0 ancestor plus a child of every ancestor of its parent.
+    links = [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id:
+        links += [
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+        ]
+    CategoryClosure.objects.bulk_create(links, ignore_conflicts=True)
+
+
+def move_category(category):
+    # Detach the subtree from its old ancestors, then attach it under the new parent's ancestors.
+    subtree = list(CategoryClosure.objects.filter(ancestor_id=category.pk).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    with transaction.atomic():
+        CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if category.parent_id:
+            ancestors = CategoryClosure.objects.filter(
+                descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+            CategoryClosure.objects.bulk_create([
+                CategoryClosure(ancestor_id=ancestor_id, descendant_id=descendant_id,
+                                depth=ancestor_depth + descendant_depth + 1)
+                for ancestor_id, ancestor_depth in ancestors
+                for descendant_id, descendant_depth in subtree
+            ])
+
+
+def rebuild_closure():
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    links = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            links.append(CategoryClosure(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    with transaction.atomic():
+        CategoryClosure.objects.all().delete()
+        CategoryClosure.objects.bulk_create(links, batch_size=2000)
+    return len(links)
+
+
+def adjust_product_totals(category_id, count, price):
+    if category_id and (count or price):
+        Category.objects.filter(pk=category_id).update(
+            product_count=F('product_count') + count, product_price_sum=F('product_price_sum') + price
+        )
+
+
+def recount_products(category_ids=None):
+    products = Product.objects.filter(category_id=OuterRef('pk')).order_by().values('category_id')
+    categories = Category.objects.all() if category_ids is None else Category.objects.filter(pk__in=category_ids)
+    return categories.update(
+        product_count=Coalesce(Subquery(products.annotate(total=Count('id')).values('total')), Value(0)),
+        product_price_sum=Coalesce(Subquery(products.annotate(total=Sum('price')).values('total')), Value(0.0)),
+    )
+
+
+def categories_with_totals():
+    # Rolled-up totals come from one aggregate over the closure, not a query per node.
+    return Category.objects.annotate(
+        products_count=Coalesce(Sum('descendant_links__descendant__product_count'), Value(0)),
+        products_price_sum=Coalesce(Sum('descendant_links__descendant__product_price_sum'), Value(0.0)),
+    ).order_by('title')
+
+
+def subtree_products(queryset, slug):
+    return queryset.filter(category__ancestor_links__ancestor__slug=slug)
+
+
+def category_tree(items):
+    nodes = {item['id']: dict(item, children=[]) for item in items}
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent'])
+        (parent['children'] if parent else roots).append(node)
+    return roots
@@ -0,0 +1,285 @@
+import json
+import os
+import tempfile
+import time
+from array import array
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+
+from texnomart.caching import invalidate_catalog, invalidate_product_detail
+from texnomart.categories import adjust_product_totals
+from texnomart.media import referenced_names
+from texnomart.models import Category, CategoryClosure, Product, Image, PendingMediaDeletion
+from texnomart.suggest import suggester
+
+ARCHIVE_DIRECTORY = 'texnomart/deleted'
+CHUNK_SIZE = 1000
+
+
+def quote(name):
+    return connection.ops.quote_name(name)
+
+
+def execute_in(sql, ids):
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(placeholders=', '.join(['%s'] * len(ids))), ids)
+
+
+def cascade_delete(model, ids):
+    # Set-based replacement for the Collector: walks the model's reverse relations and
+    # deletes or nulls dependents with one statement per table, without loading rows or
+    # sending per-row signals. Dependents that have dependents of their own are recursed
+    # into chunk by chunk.
+    for relation in model._meta.related_objects:
+        if relation.many_to_many:
+            through = relation.through._meta
+            column = next(field.column for field in through.fields
+                          if field.is_relation and field.related_model is model)
+            execute_in(f'DELETE FROM {quote(through.db_table)} WHERE {quote(column)} IN ({{placeholders}})', ids)
+            continue
+        related = relation.related_model
+        column = relation.field.column
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+        if relation.on_delete is models.SET_NULL:
+            execute_in(f'UPDATE {quote(related._meta.db_table)} SET {quote(column)} = NULL '
+                       f'WHERE {quote(column)} IN ({{placeholders}})', ids)
+            continue
+        if relation.on_delete is not models.CASCADE:
+            raise ValueError(f'Bulk delete cannot handle on_delete={relation.on_delete.__name__} '
+                             f'for {related._meta.label}.{relation.field.name}.')
+        if related._meta.related_objects or related._meta.many_to_many:
+            dependents = related._base_manager.filter(**{f'{relation.field.name}__in': ids}).order_by('pk')
+            for chunk in chunked_pks(dependents):
+                cascade_delete(related, chunk)
+        else:
+            execute_in(f'DELETE FROM {quote(related._meta.db_table)} WHERE {quote(column)} IN ({{placeholders}})', ids)
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through._meta
+        execute_in(f'DELETE FROM {quote(through.db_table)} WHERE {quote(field.m2m_column_name())} '
+                   f'IN ({{placeholders}})', ids)
+    execute_in(f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} '
+               f'IN ({{placeholders}})', ids)
+
+
+def chunked_pks(queryset, chunk_size=CHUNK_SIZE):
+    # Keyset pagination, so only one chunk of ids is held at a time.
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        chunk = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+def archive_path(name):
+    os.makedirs(ARCHIVE_DIRECTORY, exist_ok=True)
+    return os.path.join(ARCHIVE_DIRECTORY, name)
+
+
+def product_archive(product, images, category_title):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'images': [default_storage.url(image) for image in images],
+        'category': category_title,
+        'discount': product.discount,
+        'discounted_price': product.discounted_price,
+        'monthly_pay': product.monthly_pay,
+    }
+
+
+def queue_media(names):
+    PendingMediaDeletion.objects.bulk_create([PendingMediaDeletion(name=name) for name in set(names) if name])
+
+
+def delete_product_chunk(product_ids, archives):
+    # One <name>_id_<id>.json per product, as product_pre_delete writes them. They are staged in
+    # `archives` and only written out by publish_product_archives() once the deletion commits.
+    products = list(Product.objects.filter(pk__in=product_ids).select_related('category').only(
+        'id', 'name', 'description', 'price', 'discount', 'category__title'
+    ).order_by('pk'))
+    images = defaultdict(list)
+    for product_id, image in Image.objects.filter(product_id__in=product_ids).values_list('product_id', 'image'):
+        images[product_id].append(image)
+    for product in products:
+        archive = product_archive(product, images[product.pk], product.category.title)
+        archives.write(json.dumps([f'{product.name}_id_{product.pk}.json', archive]) + '\n')
+    queue_media(name for names in images.values() for name in names)
+    cascade_delete(Product, product_ids)
+    return products
+
+
+def publish_product_archives(archives):
+    archives.seek(0)
+    for line in archives:
+        name, data = json.loads(line)
+        with open(archive_path(name), 'w') as archive:
+            json.dump(data, archive, indent=4)
+
+
+def publish_archive(name, staged, start, end):
+    # Copies one archive's byte span out of the shared spool, a block at a time.
+    staged.seek(start)
+    remaining = end - start
+    with open(archive_path(name), 'wb') as archive:
+        while remaining:
+            block = staged.read(min(remaining, 64 * 1024))
+            archive.write(block)
+            remaining -= len(block)
+
+
+def keep_open_until_commit(files):
+    # A rollback closes the staged files with the with block. Inside a caller's transaction the
+    # on_commit hook runs later, so the files are handed over to it instead (a rollback of that
+    # transaction drops the hook and the files are closed when it is garbage collected).
+    if connection.in_atomic_block:
+        files.pop_all()
+
+
+def delete_products(product_ids):
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {'products': 0, 'seconds': 0}
+    start = time.perf_counter()
+    totals = defaultdict(lambda: [0, 0.0])
+    with ExitStack() as files:
+        archives = files.enter_context(tempfile.TemporaryFile('w+'))
+        with transaction.atomic():
+            for offset in range(0, len(product_ids), CHUNK_SIZE):
+                for product in delete_product_chunk(product_ids[offset:offset + CHUNK_SIZE], archives):
+                    totals[product.category_id][0] -= 1
+                    totals[product.category_id][1] -= product.price
+            for category_id, (count, price) in totals.items():
+                adjust_product_totals(category_id, count, price)
+            transaction.on_commit(lambda: after_delete(product_ids, archives))
+        keep_open_until_commit(files)
+    return {'products': len(product_ids), 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def delete_categories(category_ids):
+    # Deletes the categories with their whole subtrees, all their products and dependents.
+    start = time.perf_counter()
+    subtree = list(CategoryClosure.objects.filter(ancestor_id__in=category_ids).values_list(
+        'descendant_id', flat=True).distinct())
+    categories = list(Category.objects.filter(pk__in=subtree).values('id', 'title', 'slug', 'image'))
+    deleted_count = 0
+    with ExitStack() as files:
+        # Deleted product ids go to a temporary file chunk by chunk instead of a list, so a
+        # subtree of any size is cleared from the caches without holding its ids in memory.
+        deleted_products = files.enter_context(tempfile.TemporaryFile())
+        product_archives = files.enter_context(tempfile.TemporaryFile('w+'))
+        # Every category archive goes to this one spool, one after the other; category_archives
+        # keeps each one's name and byte span, so the open files do not grow with the subtree.
+        category_spool = files.enter_context(tempfile.TemporaryFile())
+        category_archives = []
+
+        def write(text):
+            # json.dumps() escapes to ASCII, so the encoded spans match what json.dump would write.
+            category_spool.write(text.encode())
+
+        with transaction.atomic():
+            for category in categories:
+                # Same layout as category_pre_delete's json.dump(..., indent=4), with the product
+                # names streamed in as their chunks are deleted.
+                archive_start = category_spool.tell()
+                write(f'{{\n    "id": {category["id"]},\n    "title": {json.dumps(category["title"])},\n'
+                      f'    "products": [')
+                first = True
+                products = Product.objects.filter(category_id=category['id']).order_by('pk')
+                for chunk in chunked_pks(products):
+                    for product in delete_product_chunk(chunk, product_archives):
+                        write(f'{"" if first else ","}\n        {json.dumps(product.name)}')
+                        first = False
+                    array('q', chunk).tofile(deleted_products)
+                    deleted_count += len(chunk)
+                write(']' if first else '\n    ]')
+                write(f',\n    "slug": {json.dumps(category["slug"])}\n}}')
+                category_archives.append((f"{category['title']}_id_{category['id']}.json",
+                                          archive_start, category_spool.tell()))
+            queue_media(category['image'] for category in categories)
+            for offset in range(0, len(subtree), CHUNK_SIZE):
+                cascade_delete(Category, subtree[offset:offset + CHUNK_SIZE])
+            slugs = [category['slug'] for category in categories]
+            transaction.on_commit(lambda: after_delete_categories(
+                deleted_products, slugs, product_archives, category_spool, category_archives
+            ))
+        keep_open_until_commit(files)
+    return {'categories': len(categories), 'products': deleted_count,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def after_delete(product_ids, archives):
+    with archives:
+        publish_product_archives(archives)
+    invalidate_catalog(product_ids)
+    if len(product_ids) > 100:
+        suggester.expire()
+    else:
+        for product_id in product_ids:
+            suggester.product_removed(product_id)
+
+
+def spooled_ids(spool, chunk_size=CHUNK_SIZE):
+    spool.seek(0)
+    while True:
+        chunk = array('q')
+        try:
+            chunk.fromfile(spool, chunk_size)
+        except EOFError:
+            # The last, shorter chunk is still read into the array.
+            if chunk:
+                yield chunk.tolist()
+            return
+        yield chunk.tolist()
+
+
+def after_delete_categories(deleted_products, category_slugs, product_archives, category_spool, category_archives):
+    with product_archives:
+        publish_product_archives(product_archives)
+    with category_spool:
+        for name, start, end in category_archives:
+            publish_archive(name, category_spool, start, end)
+    with deleted_products:
+        invalidate_catalog(category_slugs=[*Category.objects.values_list('slug', flat=True), *category_slugs])
+        for chunk in spooled_ids(deleted_products):
+            invalidate_product_detail(*chunk)
+    suggester.expire()
+
+
+def recently_modified(name, cutoff):
+    try:
+        return default_storage.get_modified_time(name).timestamp() > cutoff
+    except FileNotFoundError:
+        return False
+
+
+def purge_media(batch_size=500, min_age=3600):
+    # Shared files (seeded catalogs reuse the same image) are only removed once unreferenced.
+    # Files touched within min_age seconds stay queued for the next run, as in gc_media.
+    removed = kept = deferred = 0
+    cutoff = time.time() - min_age
+    last = 0
+    while True:
+        batch = list(PendingMediaDeletion.objects.filter(pk__gt=last).order_by('pk')[:batch_size])
+        if not batch:
+            return removed, kept, deferred
+        last = batch[-1].pk
+        names = {pending.name for pending in batch}
+        referenced = referenced_names(names)
+        recent = {name for name in names - referenced if recently_modified(name, cutoff)}
+        for name in names - referenced - recent:
+            default_storage.delete(name)
+            removed += 1
+        kept += len(names & referenced)
+        deferred += len(recent)
+        PendingMediaDeletion.objects.filter(
+            pk__in=[pending.pk for pending in batch if pending.name not in recent]
+        ).delete()
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from texnomart.benchmarks import BENCH_HOST, BENCH_CLIENT_IP, summarize, bench_settings
+from texnomart.models import Product, Category
+
+ENDPOINTS = [
+    ('product list', '/texnomart-uz/', '/texnomart-uz/async/'),
+    ('category list', '/texnomart-uz/categories/', '/texnomart-uz/async/categories/'),
+    ('category products', '/texnomart-uz/category/{slug}/', '/texnomart-uz/async/category/{slug}/'),
+    ('product detail', '/texnomart-uz/product/detail/{pk}/', '/texnomart-uz/async/product/detail/{pk}/'),
+]
+
+
+def wsgi_call(handler, path, token):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': BENCH_HOST,
+        'SERVER_PORT': '80',
+        'REMOTE_ADDR': BENCH_CLIENT_IP,
+        'HTTP_HOST': BENCH_HOST,
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+    status = []
+    response = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+    b''.join(response)
+    response.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_call(handler, path, token):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'host', BENCH_HOST.encode()), (b'authorization', f'Bearer {token}'.encode())],
+        'client': (BENCH_CLIENT_IP, 50000),
+        'server': (BENCH_HOST, 80),
+    }
+    messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+    status = []
+
+    async def receive():
+        message = next(messages, None)
+        if message is None:
+            await asyncio.Future()
+        return message
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await handler(scope, receive, send)
+    return status[0]
+
+
+def run_wsgi(handler, path, token, requests, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        code = wsgi_call(handler, path, token)
+        return time.perf_counter() - start, code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    return time.perf_counter() - start, results
+
+
+def run_asgi(handler, path, token, requests, concurrency):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed():
+            async with semaphore:
+                start = time.perf_counter()
+                code = await asgi_call(handler, path, token)
+                return time.perf_counter() - start, code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(timed() for _ in range(requests)))
+        return time.perf_counter() - start, results
+
+    return asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = 'Compares throughput and p99 latency of the WSGI path against the ASGI sync and async read paths.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and mode.')
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--username', help='User to authenticate as (defaults to the first active user).')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file.')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=options['username']).first() if options['username'] else users.first()
+        category = Category.objects.filter(products__isnull=False).first()
+        product = Product.objects.first()
+        if not (user and category and product):
+            raise CommandError('The benchmark needs at least one active user, category and product.')
+        token = str(RefreshToken.for_user(user).access_token)
+
+        results = []
+        with override_settings(**bench_settings(settings)):
+            wsgi_handler, asgi_handler = WSGIHandler(), ASGIHandler()
+            for label, sync_path, async_path in ENDPOINTS:
+                sync_path = sync_path.format(slug=category.slug, pk=product.pk)
+                async_path = async_path.format(slug=category.slug, pk=product.pk)
+                modes = [
+                    ('wsgi', run_wsgi, wsgi_handler, sync_path),
+                    ('asgi-sync', run_asgi, asgi_handler, sync_path),
+                    ('asgi-async', run_asgi, asgi_handler, async_path),
+                ]
+                for mode, runner, handler, path in modes:
+                    runner(handler, path, token, 1, 1)
+                    elapsed, timings = runner(handler, path, token, options['requests'], options['concurrency'])
+                    row = {
+                        'endpoint': label,
+                        'mode': mode,
+                        'path': path,
+                        'requests': options['requests'],
+                        'concurrency': options['concurrency'],
+                        'errors': sum(1 for _, code in timings if code >= 400),
+                        'throughput_rps': round(options['requests'] / elapsed, 1),
+                        **summarize([latency for latency, _ in timings]),
+                    }
+                    results.append(row)
+                    self.stdout.write(
+                        f"{label:<18} {mode:<10} {row['throughput_rps']:>9} req/s  "
+                        f"p50 {row['p50_ms']:>8} ms  p99 {row['p99_ms']:>8} ms  errors {row['errors']}"
+                    )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=4)
@@ -0,0 +1,79 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from texnomart.authentication import CachedJWTAuthentication, TokenUserAuthentication, local_users
+from texnomart.benchmarks import BENCH_HOST, summarize, bench_settings
+
+
+class Command(BaseCommand):
+    help = ('Measures JWT authentication overhead per request in a throwaway test database: the stock '
+            'JWTAuthentication (one User query per request), CachedJWTAuthentication served from the '
+            'shared cache and from the in-process cache, and the TokenUser path used by read-only views.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(**bench_settings(settings)):
+                rows = self.bench(options['requests'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=4))
+            return
+        for row in rows:
+            self.stdout.write(
+                f"{row['mode']:<20} p50 {row['p50_ms']:>7} ms  p95 {row['p95_ms']:>7} ms  "
+                f"p99 {row['p99_ms']:>7} ms  {row['queries_per_request']:.2f} queries/request"
+            )
+
+    def bench(self, requests):
+        user = User.objects.create_user('bench_auth', 'bench_auth@example.com', 'bench-Password-1')
+        request = RequestFactory(HTTP_HOST=BENCH_HOST).get(
+            '/texnomart-uz/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'
+        )
+
+        def shared_only():
+            # Every request misses the worker's cache, as after AUTH_USER_LOCAL_SECONDS.
+            local_users.clear()
+
+        modes = [
+            ('JWTAuthentication', JWTAuthentication(), None),
+            ('cached (shared)', CachedJWTAuthentication(), shared_only),
+            ('cached (local)', CachedJWTAuthentication(), None),
+            ('TokenUser', TokenUserAuthentication(), None),
+        ]
+        rows = []
+        for label, authentication, before_each in modes:
+            cache.clear()
+            local_users.clear()
+            authentication.authenticate(request)
+            latencies = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(requests):
+                    if before_each:
+                        before_each()
+                    start = time.perf_counter()
+                    authenticated, _ = authentication.authenticate(request)
+                    latencies.append(time.perf_counter() - start)
+            assert authenticated.pk == user.pk
+            rows.append({'mode': label, 'queries_per_request': len(queries) / requests, **summarize(latencies)})
+        return rows
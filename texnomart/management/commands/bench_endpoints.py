@@ -0,0 +1,158 @@
+import json
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from texnomart.benchmarks import BENCH_HOST, summarize, bench_settings
+from texnomart.models import Category, Product
+from texnomart.urls import urlpatterns
+
+BENCH_PASSWORD = 'bench-Password-1'
+# 1x1 transparent GIF, enough for ImageField validation.
+TINY_GIF = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00,'
+            b'\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def request_spec(pattern, iteration, user):
+    name = pattern.name
+    if name == 'user_login':
+        return 'post', {'username': user.username, 'password': BENCH_PASSWORD}, 'application/json'
+    if name == 'user_register':
+        username = f'bench_register_{time.perf_counter_ns()}_{iteration}'
+        return 'post', {
+            'username': username, 'email': f'{username}@example.com', 'first_name': 'Bench', 'last_name': 'User',
+            'password': BENCH_PASSWORD, 'password2': BENCH_PASSWORD,
+        }, 'application/json'
+    if name == 'user_logout':
+        return 'post', {'refresh': str(RefreshToken.for_user(user))}, 'application/json'
+    if name == 'category-add':
+        return 'post', {
+            'title': f'Bench category {time.perf_counter_ns()}_{iteration}',
+            'image': SimpleUploadedFile('bench.gif', TINY_GIF, content_type='image/gif'),
+        }, None
+    return 'get', None, None
+
+
+def bench_pattern(client, path, pattern, user, iterations):
+    latencies, query_counts, sizes, statuses = [], [], [], set()
+    for iteration in range(iterations):
+        method, data, content_type = request_spec(pattern, iteration, user)
+        kwargs = {'content_type': content_type} if content_type else {}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, **kwargs) if data else getattr(client, method)(path)
+            latencies.append(time.perf_counter() - start)
+        query_counts.append(len(queries))
+        sizes.append(len(response.content))
+        statuses.add(response.status_code)
+    return {
+        'endpoint': f'{pattern.name} {pattern.pattern}',
+        'method': method.upper(),
+        'path': path,
+        'status': sorted(statuses),
+        'iterations': iterations,
+        **summarize(latencies),
+        'queries_cold': query_counts[0],
+        'queries_warm': query_counts[-1],
+        'response_bytes': sizes[-1],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Seeds a throwaway test database at several catalog sizes and records p50/p95/p99 latency, '
+            'query count and response size for every URL in texnomart/urls.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--output', help='Result file (defaults to benchmarks/<git revision>.json).')
+        parser.add_argument('--compare', help='Earlier result file to diff the new results against.')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f'{git_revision()}.json')
+        report = {'revision': git_revision(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scales': {}}
+
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(**bench_settings(settings), MEDIA_ROOT=media_root):
+                for scale in options['scales']:
+                    report['scales'][str(scale)] = self.bench_scale(scale, options['iterations'])
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=4, sort_keys=True))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), report)
+
+    def bench_scale(self, scale, iterations):
+        call_command('seed_catalog', products=scale, categories=max(15, scale // 500), flush=True,
+                     verbosity=0, stdout=self.stdout)
+        cache.clear()
+        user = User.objects.filter(username='bench').first() or User.objects.create_user(
+            'bench', 'bench@example.com', BENCH_PASSWORD
+        )
+        client = Client(HTTP_HOST=BENCH_HOST, headers={
+            'authorization': f'Bearer {RefreshToken.for_user(user).access_token}'
+        })
+        category = Category.objects.filter(products__isnull=False).first()
+        product = Product.objects.filter(category=category).first()
+        kwargs = {'slug': category.slug, 'pk': product.pk}
+
+        rows = []
+        for pattern in urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            route = str(pattern.pattern).replace('<slug:slug>', kwargs['slug']).replace('<int:pk>', str(kwargs['pk']))
+            path = f'/texnomart-uz/{route}'
+            if pattern.name == 'product-batch':
+                path += '?ids=' + ','.join(str(pk) for pk in Product.objects.values_list('pk', flat=True)[:20])
+            row = bench_pattern(client, path, pattern, user, iterations)
+            rows.append(row)
+            self.stdout.write(
+                f"{scale:>7} {row['method']:<5} {path[:60]:<60} p50 {row['p50_ms']:>9} ms  "
+                f"p99 {row['p99_ms']:>9} ms  queries {row['queries_cold']}/{row['queries_warm']}  "
+                f"{row['response_bytes']} B  {row['status']}"
+            )
+        return rows
+
+    def compare(self, baseline, report):
+        self.stdout.write(f"\nComparing {baseline['revision']} -> {report['revision']}")
+        for scale, rows in report['scales'].items():
+            before = {row['endpoint']: row for row in baseline['scales'].get(scale, [])}
+            for row in rows:
+                old = before.get(row['endpoint'])
+                if not old:
+                    continue
+                self.stdout.write(
+                    f"{scale:>7} {row['endpoint'][:50]:<50} p95 {old['p95_ms']} -> {row['p95_ms']} ms  "
+                    f"queries {old['queries_cold']} -> {row['queries_cold']}"
+                )
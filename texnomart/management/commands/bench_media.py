@@ -0,0 +1,96 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.views.static import serve
+
+from texnomart.benchmarks import BENCH_HOST, summarize
+from texnomart.management.commands.gc_media import walk
+from texnomart.media import serve_media
+
+
+def largest_file(directory='images'):
+    return max(walk(default_storage, directory), key=default_storage.size, default=None)
+
+
+def consume(response, sink):
+    # Returns the bytes that went through the Python process.
+    if getattr(response, 'file_to_stream', None) is not None and sink is not None:
+        # What a server with wsgi.file_wrapper does: the kernel copies the file.
+        source = response.file_to_stream
+        size, offset = os.fstat(source.fileno()).st_size, 0
+        while offset < size:
+            sent = os.sendfile(sink, source.fileno(), offset, size - offset)
+            if not sent:
+                break
+            offset += sent
+        response.close()
+        return 0
+    if response.streaming:
+        read = sum(len(chunk) for chunk in response.streaming_content)
+        response.close()
+        return read
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    help = ('Measures worker time per image request for the old django.views.static.serve, serve_media '
+            'streaming through Python, serve_media handed to sendfile(), X-Accel-Redirect offloading, '
+            'a Range request and a conditional 304.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--file', help='Media-relative name (defaults to the largest file under images/).')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        name = options['file'] or largest_file()
+        if not name or not default_storage.exists(name):
+            raise CommandError('No media file to serve; pass --file.')
+        size = default_storage.size(name)
+        factory = RequestFactory(HTTP_HOST=BENCH_HOST)
+        path = settings.MEDIA_URL + name
+        response = serve_media(factory.get(path), name)
+        etag = response['ETag']
+        response.close()
+
+        modes = [
+            ('static.serve', lambda: serve(factory.get(path), name, document_root=settings.MEDIA_ROOT), {}, False),
+            ('python stream', lambda: serve_media(factory.get(path), name), {}, False),
+            ('sendfile', lambda: serve_media(factory.get(path), name), {}, True),
+            ('x-accel-redirect', lambda: serve_media(factory.get(path), name),
+             {'MEDIA_ACCEL_REDIRECT_PREFIX': '/protected-media/'}, False),
+            ('range 64k', lambda: serve_media(factory.get(path, HTTP_RANGE='bytes=0-65535'), name), {}, False),
+            ('304', lambda: serve_media(factory.get(path, HTTP_IF_NONE_MATCH=etag), name), {}, False),
+        ]
+        rows = []
+        with open(os.devnull, 'wb') as devnull, override_settings(ALLOWED_HOSTS=[BENCH_HOST],
+                                                                  MEDIA_ACCEL_REDIRECT_PREFIX='',
+                                                                  MEDIA_SENDFILE_HEADER=''):
+            for label, view, overrides, use_sendfile in modes:
+                sink = devnull.fileno() if use_sendfile else None
+                with override_settings(**overrides):
+                    latencies, status = [], None
+                    for _ in range(options['requests']):
+                        start = time.perf_counter()
+                        response = view()
+                        through_worker = consume(response, sink)
+                        latencies.append(time.perf_counter() - start)
+                        status = response.status_code
+                rows.append({'mode': label, 'status': status, 'worker_bytes': through_worker,
+                             **summarize(latencies)})
+
+        if options['json']:
+            self.stdout.write(json.dumps({'file': name, 'size': size, 'results': rows}, indent=4))
+            return
+        self.stdout.write(f'{name} ({size} bytes), {options["requests"]} requests per mode')
+        for row in rows:
+            self.stdout.write(
+                f"{row['mode']:<18} {row['status']}  p50 {row['p50_ms']:>8} ms  p95 {row['p95_ms']:>8} ms  "
+                f"p99 {row['p99_ms']:>8} ms  {row['worker_bytes']:>8} B through the worker"
+            )
@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from texnomart.benchmarks import summarize
+
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+def run(path, pragmas, batches, batch_size, readers):
+    conn = connect(path, pragmas)
+    conn.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, price REAL, category_id INTEGER)')
+    conn.execute('CREATE INDEX product_category ON product (category_id)')
+    conn.executemany('INSERT INTO product (name, price, category_id) VALUES (?, ?, ?)',
+                     ((f'product {i}', i * 1.5, i % 50) for i in range(batch_size)))
+    conn.close()
+
+    writing = threading.Event()
+    writing.set()
+    latencies, write_times = [], []
+
+    def writer():
+        conn = connect(path, pragmas)
+        for batch in range(batches):
+            start = time.perf_counter()
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT INTO product (name, price, category_id) VALUES (?, ?, ?)',
+                             ((f'bulk {batch}-{i}', i * 2.0, i % 50) for i in range(batch_size)))
+            conn.execute('UPDATE product SET price = price * 1.01 WHERE category_id = ?', (batch % 50,))
+            conn.execute('COMMIT')
+            write_times.append(time.perf_counter() - start)
+        conn.close()
+        writing.clear()
+
+    def reader(category_id):
+        conn = connect(path, pragmas)
+        while writing.is_set():
+            start = time.perf_counter()
+            conn.execute('SELECT id, name, price FROM product WHERE category_id = ? ORDER BY id DESC LIMIT 50',
+                         (category_id,)).fetchall()
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(i,)) for i in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, write_times
+
+
+class Command(BaseCommand):
+    help = 'Shows how long catalog reads stall behind bulk writes with rollback journaling and with WAL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batches', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=100000)
+        parser.add_argument('--readers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        wal_pragmas = settings.SQLITE_PRAGMAS
+        rollback_pragmas = [
+            'PRAGMA journal_mode=DELETE' if pragma.startswith('PRAGMA journal_mode') else pragma
+            for pragma in wal_pragmas
+        ]
+        for label, pragmas in (('rollback journal', rollback_pragmas), ('WAL', wal_pragmas)):
+            with tempfile.TemporaryDirectory() as directory:
+                latencies, write_times = run(os.path.join(directory, 'bench.sqlite3'), pragmas,
+                                             options['batches'], options['batch_size'], options['readers'])
+            stats = summarize(latencies)
+            self.stdout.write(
+                f"{label:<17} reads {len(latencies):>7}  p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms  "
+                f"max {round(max(latencies) * 1000, 3)} ms  avg write batch "
+                f"{round(sum(write_times) / len(write_times) * 1000, 1)} ms"
+            )
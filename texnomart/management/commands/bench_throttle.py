@@ -0,0 +1,62 @@
+import json
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+
+from texnomart.benchmarks import summarize
+from texnomart.throttling import THROTTLE_CACHE, SearchThrottle
+
+
+class HistoryThrottle(AnonRateThrottle):
+    # DRF's timestamp-list throttle on the same cache and budget, for comparison.
+    scope = 'search'
+
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[THROTTLE_CACHE]
+
+
+class Command(BaseCommand):
+    help = ('Measures the per-request cost of texnomart.throttling against DRF\'s SimpleRateThrottle '
+            'on the throttle cache, for requests within the budget and for rejected ones.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--limit', type=int, default=1000,
+                            help='Budget per minute; requests beyond it measure the rejected path.')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        rows = []
+        for label, throttle_class in [('SimpleRateThrottle', HistoryThrottle), ('CounterRateThrottle', SearchThrottle)]:
+            caches[THROTTLE_CACHE].clear()
+            allowed_latencies, rejected_latencies = [], []
+            for _ in range(options['requests']):
+                request = Request(factory.get('/texnomart-uz/?search=tv', REMOTE_ADDR='10.0.0.2'))
+                start = time.perf_counter()
+                throttle = throttle_class()
+                throttle.num_requests, throttle.duration = options['limit'], 60
+                allowed = throttle.allow_request(request, None)
+                elapsed = time.perf_counter() - start
+                (allowed_latencies if allowed else rejected_latencies).append(elapsed)
+            rows.append({
+                'throttle': label,
+                'allowed': {'requests': len(allowed_latencies), **summarize(allowed_latencies)},
+                'rejected': {'requests': len(rejected_latencies), **summarize(rejected_latencies)},
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=4))
+            return
+        for row in rows:
+            for outcome in ('allowed', 'rejected'):
+                result = row[outcome]
+                self.stdout.write(
+                    f"{row['throttle']:<20} {outcome:<8} {result['requests']:>6} requests  "
+                    f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms"
+                )
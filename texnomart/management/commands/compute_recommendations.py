@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from texnomart.models import Product, ProductRecommendation, RecommendationUpdate
+from texnomart.recommendations import interacting_products, queue_neighbours, rebuild, unqueue
+
+
+class Command(BaseCommand):
+    help = ('Builds "customers also liked" recommendations from the likes graph. By default only products queued '
+            'by like/comment signals are recomputed; --full rebuilds every product.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--top-k', type=int, default=12)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--metric', choices=['cosine', 'jaccard'], default='cosine')
+        parser.add_argument('--min-common', type=int, default=1, help='Minimum shared users for a pair to count.')
+        parser.add_argument('--with-ratings', action='store_true',
+                            help='Treat comments rated 4 or 5 as likes.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if not options['full']:
+            queue_neighbours(options['with_ratings'])
+        started_at = timezone.now()
+        active_ids = interacting_products(options['with_ratings'])
+
+        updates = Product.objects if options['full'] else RecommendationUpdate.objects
+        product_ids = list(updates.order_by('pk').values_list('pk', flat=True))
+
+        rows = 0
+        batch_size = options['batch_size']
+        for offset in range(0, len(product_ids), batch_size):
+            batch = product_ids[offset:offset + batch_size]
+            # Products nobody interacts with any more lose their recommendations.
+            inactive = [product_id for product_id in batch if product_id not in active_ids]
+            ProductRecommendation.objects.filter(product_id__in=inactive).delete()
+            unqueue(inactive, started_at)
+            active = [product_id for product_id in batch if product_id in active_ids]
+            if active:
+                rows += rebuild(active, options['top_k'], options['metric'], options['with_ratings'],
+                                options['min_common'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {len(product_ids)} products ({rows} recommendations) in {time.perf_counter() - start:.1f}s.'
+        ))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from texnomart.caching import invalidate_catalog
+from texnomart.popularity import decay, rebuild, daily_decay_factor, HALF_LIFE_DAYS
+
+
+class Command(BaseCommand):
+    help = ('Decays Product.popularity so recent comments outweigh old ones; likes keep full weight. '
+            'Meant to run daily; --rebuild recomputes every score from the likes and comments tables instead.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life', type=float, default=HALF_LIFE_DAYS, help='Half-life in days.')
+        parser.add_argument('--factor', type=float, help='Explicit multiplier; overrides --half-life.')
+        parser.add_argument('--rebuild', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['rebuild']:
+            updated = rebuild(options['batch_size'], options['half_life'])
+            action = 'Rebuilt'
+        else:
+            factor = options['factor'] or daily_decay_factor(options['half_life'])
+            updated = decay(factor, options['batch_size'])
+            action = f'Decayed (x{factor:.4f})'
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} popularity of {updated} products in {time.perf_counter() - start:.1f}s.'
+        ))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from texnomart.media import MEDIA_FIELDS, all_referenced_names
+from texnomart.storage import is_content_addressed
+
+
+def walk(storage, directory=''):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}' if directory else name
+    for child in directories:
+        yield from walk(storage, f'{directory}/{child}' if directory else child)
+
+
+class Command(BaseCommand):
+    help = ('Deletes media files that no Image or Category row references. Files younger than --min-age are '
+            'kept so uploads whose rows are not committed yet survive. --rehash first moves legacy file names '
+            'onto content-addressed ones so duplicate copies become garbage.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--min-age', type=int, default=3600, help='Seconds.')
+        parser.add_argument('--rehash', action='store_true')
+        parser.add_argument('--directory', default='images')
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if options['rehash']:
+            self.rehash(storage, options['dry_run'])
+
+        referenced = all_referenced_names()
+        cutoff = time.time() - options['min_age']
+        removed = kept = freed = 0
+        for name in walk(storage, options['directory']):
+            if name in referenced:
+                kept += 1
+                continue
+            if storage.get_modified_time(name).timestamp() > cutoff:
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(f'would remove {name} ({size} bytes)')
+            else:
+                storage.delete(name)
+            removed += 1
+            freed += size
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {removed} unreferenced files ({freed / 1024 / 1024:.1f} MB); {kept} referenced files kept.'
+        ))
+
+    def rehash(self, storage, dry_run):
+        legacy = sorted(name for name in all_referenced_names() if not is_content_addressed(name))
+        for name in legacy:
+            if not storage.exists(name):
+                self.stderr.write(f'missing {name}, left as is')
+                continue
+            if dry_run:
+                self.stdout.write(f'would rehash {name}')
+                continue
+            with storage.open(name) as content:
+                hashed = storage.save(name, content)
+            with transaction.atomic():
+                for model, field in MEDIA_FIELDS:
+                    model._base_manager.filter(**{field: name}).update(**{field: hashed})
+            self.stdout.write(f'{name} -> {hashed}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from texnomart.revocation import prune_revoked_tokens
+
+
+class Command(BaseCommand):
+    help = ('Deletes every revoked refresh token that has expired. Logouts already prune a batch every '
+            'REVOKED_TOKEN_PRUNE_EVERY revocations; this clears a backlog in one go.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        removed = prune_revoked_tokens(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired revocations.'))
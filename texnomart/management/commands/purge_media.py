@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from texnomart.deletion import purge_media
+
+
+class Command(BaseCommand):
+    help = 'Removes media files queued by bulk deletes once no image or category references them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Seconds; files modified more recently stay queued.')
+
+    def handle(self, *args, **options):
+        removed, kept, deferred = purge_media(options['batch_size'], options['min_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Removed {removed} files, kept {kept} still in use, left {deferred} recently touched in the queue.'
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from texnomart.caching import invalidate_catalog
+from texnomart.categories import rebuild_closure, recount_products
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the category closure table from parent pointers and recounts per-category product totals. '
+            'Run after bulk moves or imports that bypass model signals.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-totals', action='store_true', help='Only rebuild the closure table.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        links = rebuild_closure()
+        message = f'Rebuilt {links} closure rows'
+        if not options['skip_totals']:
+            message += f' and recounted {recount_products()} categories'
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(f'{message} in {time.perf_counter() - start:.1f}s.'))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from texnomart.campaigns import run_due_campaigns
+
+
+class Command(BaseCommand):
+    help = ('Starts campaigns whose start time has passed and ends the ones whose end time has passed, each '
+            'with set-based UPDATEs and one cache invalidation. Run it from cron every minute, or keep it '
+            'running with --interval.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Seconds between checks; 0 checks once and exits.')
+
+    def handle(self, *args, **options):
+        while True:
+            run_due_campaigns(log=self.stdout.write)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,148 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import slugify
+
+from texnomart.attributes import AttributeInterner, refresh_attributes_data
+from texnomart.models import Category, Product, Image, Attribute, Comment
+from texnomart.categories import rebuild_closure, recount_products
+from texnomart.deletion import cascade_delete, chunked_pks
+from texnomart.popularity import rebuild as rebuild_popularity
+
+SEED_USER_PREFIX = 'seed_user_'
+CATEGORY_TYPES = ['Smartfonlar', 'Televizorlar', 'Noutbuklar', 'Planshetlar', 'Muzlatgichlar', 'Konditsionerlar',
+                  'Kir yuvish mashinalari', 'Changyutgichlar', 'Quloqchinlar', 'Monitorlar', 'Mikroto\'lqinli pechlar',
+                  'Aqlli soatlar', 'Fotoapparatlar', 'O\'yin konsollari', 'Printerlar']
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'LG', 'Artel', 'Huawei', 'Sony', 'Lenovo', 'HP', 'Acer', 'Philips', 'Bosch']
+ATTRIBUTE_KEYS = ['Rang', 'Ekran o\'lchami', 'Protsessor', 'Xotira', 'Operativ xotira', 'Batareya', 'Kafolat',
+                  'Og\'irligi', 'Quvvat', 'Ishlab chiqarilgan mamlakat', 'HDR Formati', 'Ekranni yangilanish tezligi']
+ATTRIBUTE_VALUES = ['Qora', 'Oq', 'Kumush', 'Ko\'k', '6.1"', '6.7"', '55"', '65"', 'Snapdragon 8 Gen 2', 'A17 Pro',
+                    '128 GB', '256 GB', '512 GB', '8 GB', '12 GB', '5000 mAh', '12 oy', '24 oy', '1.2 kg', '2000 W',
+                    'Xitoy', 'Koreya', 'O\'zbekiston', 'HDR10', 'Dolby Vision', '60 Gts', '120 Gts']
+IMAGES = ['images/smartfon.jpg', 'images/televizor.jpg']
+COMMENTS = ['Zo\'r mahsulot, tavsiya qilaman.', 'Narxiga arziydi.', 'Yetkazib berish tez bo\'ldi.',
+            'Sifati kutganimdan past.', 'Ikki haftadan beri ishlatyapman, muammo yo\'q.']
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic catalog (categories, products, images, attributes, comments, likes) with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=30)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--images', type=int, default=2, help='Images per product.')
+        parser.add_argument('--attributes', type=int, default=5, help='Attributes per product.')
+        parser.add_argument('--comments', type=int, default=3, help='Average comments per product.')
+        parser.add_argument('--likes', type=int, default=5, help='Average likes per product.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--flush', action='store_true', help='Remove the existing catalog and seed users first.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+
+        if options['flush']:
+            self.flush()
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            categories = self.create_categories(options['categories'])
+            interner = AttributeInterner()
+            keys = [interner.key_id(key) for key in ATTRIBUTE_KEYS]
+            values = [interner.value_id(value) for value in ATTRIBUTE_VALUES]
+
+        batch_size = options['batch_size']
+        for offset in range(0, options['products'], batch_size):
+            with transaction.atomic():
+                count = min(batch_size, options['products'] - offset)
+                products = self.create_products(rng, categories, offset, count)
+                self.create_children(rng, products, users, keys, values, options)
+        # bulk_create skips the signals that maintain popularity, the category closure and category totals.
+        rebuild_popularity(options['batch_size'])
+        rebuild_closure()
+        recount_products()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['products']} products in {len(categories)} categories "
+            f"in {time.perf_counter() - start:.1f}s."
+        ))
+
+    def flush(self):
+        # cascade_delete walks every table that points at a category or product (closure rows,
+        # recommendations, campaigns, ...), so new dependents cannot break the flush.
+        with transaction.atomic():
+            for chunk in chunked_pks(Category.objects.order_by('pk')):
+                cascade_delete(Category, chunk)
+        User.objects.filter(username__startswith=SEED_USER_PREFIX).delete()
+
+    def create_users(self, count):
+        existing = User.objects.filter(username__startswith=SEED_USER_PREFIX).count()
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(username=f'{SEED_USER_PREFIX}{i}', email=f'{SEED_USER_PREFIX}{i}@example.com', password=password)
+            for i in range(existing, count)
+        ])
+        return list(User.objects.filter(username__startswith=SEED_USER_PREFIX).values_list('id', flat=True))
+
+    def create_categories(self, count):
+        titles = [
+            CATEGORY_TYPES[i] if i < len(CATEGORY_TYPES) else f'{CATEGORY_TYPES[i % len(CATEGORY_TYPES)]} {i}'
+            for i in range(count)
+        ]
+        slugs = [slugify(title) for title in titles]
+        existing = set(Category.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+        Category.objects.bulk_create([
+            Category(title=title, slug=slug, image=IMAGES[i % len(IMAGES)])
+            for i, (title, slug) in enumerate(zip(titles, slugs)) if slug not in existing
+        ], ignore_conflicts=True)
+        # Numbered categories become subcategories of the type they were named after.
+        roots = {category.slug: category for category in Category.objects.filter(slug__in=slugs[:len(CATEGORY_TYPES)])}
+        for i, slug in enumerate(slugs[len(CATEGORY_TYPES):], len(CATEGORY_TYPES)):
+            Category.objects.filter(slug=slug, parent__isnull=True).update(
+                parent=roots[slugs[i % len(CATEGORY_TYPES)]]
+            )
+        return list(Category.objects.filter(slug__in=slugs))
+
+    def create_products(self, rng, categories, offset, count):
+        products = []
+        for i in range(offset, offset + count):
+            category = rng.choice(categories)
+            name = f'{rng.choice(BRANDS)} {category.title} {rng.randint(100, 9999)}'
+            products.append(Product(
+                name=name,
+                slug=f'{slugify(name)}-{i}',
+                price=float(rng.randrange(300_000, 40_000_000, 1000)),
+                description=f'{name} - rasmiy kafolat va bepul yetkazib berish bilan.',
+                category=category,
+                discount=rng.choice([0, 0, 0, 5, 10, 15, 20]),
+            ))
+        return Product.objects.bulk_create(products)
+
+    def create_children(self, rng, products, users, keys, values, options):
+        Image.objects.bulk_create([
+            Image(product=product, image=IMAGES[i % len(IMAGES)], is_primary=i == 0)
+            for product in products for i in range(options['images'])
+        ])
+        Attribute.objects.bulk_create([
+            Attribute(product=product, key_id=key, value_id=rng.choice(values))
+            for product in products for key in rng.sample(keys, min(options['attributes'], len(keys)))
+        ])
+        refresh_attributes_data([product.pk for product in products])
+        if not users:
+            return
+        Comment.objects.bulk_create([
+            Comment(product=product, user_id=rng.choice(users), rating=rng.randint(0, 5), content=rng.choice(COMMENTS))
+            for product in products for _ in range(rng.randint(0, options['comments'] * 2))
+        ])
+        Likes = Product.user_likes.through
+        Likes.objects.bulk_create([
+            Likes(product_id=product.id, user_id=user_id)
+            for product in products
+            for user_id in rng.sample(users, min(rng.randint(0, options['likes'] * 2), len(users)))
+        ])
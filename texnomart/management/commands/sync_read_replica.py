@@ -0,0 +1,30 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from config.db_router import REPLICA_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database into the read replica file using the online backup API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1024,
+                            help='Pages copied per step; the primary is unlocked between steps.')
+
+    def handle(self, *args, **options):
+        if REPLICA_DB_ALIAS not in settings.DATABASES:
+            raise CommandError('No read replica configured, set TEXNOMART_REPLICA_DB first.')
+
+        start = time.perf_counter()
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        target = sqlite3.connect(settings.DATABASES[REPLICA_DB_ALIAS]['NAME'])
+        try:
+            source.backup(target, pages=options['pages'])
+            target.execute('PRAGMA journal_mode=WAL')
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f'Replica refreshed in {time.perf_counter() - start:.2f}s.'))
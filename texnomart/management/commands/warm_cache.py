@@ -0,0 +1,152 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache, caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+
+from texnomart.caching import product_detail_cache_key, category_products_cache_keys
+from texnomart.models import Category, Product
+from texnomart.views.texnomart import async_views
+from texnomart.views.texnomart.views import CategoryView, CategoryProductsView, ProductDetailView, \
+    all_products_queryset
+
+category_view = CategoryView.as_view()
+category_products_view = CategoryProductsView.as_view()
+product_detail_view = ProductDetailView.as_view()
+
+
+def default_host():
+    # Wildcards and the development hosts Django allows with an empty ALLOWED_HOSTS are no real host.
+    hosts = [host for host in settings.ALLOWED_HOSTS
+             if host != '*' and not host.startswith('.') and host not in ('localhost', '127.0.0.1', '[::1]')]
+    return hosts[0] if hosts else None
+
+
+# The backends that enforce MAX_ENTRIES by culling.
+CULLING_CACHES = (DatabaseCache, FileBasedCache, LocMemCache)
+
+
+def within_capacity(tasks):
+    # Tasks are listed most important first; the ones past half the cache's MAX_ENTRIES are
+    # dropped. Backends without a local entry limit (Redis, Memcached) take everything.
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(backend, CULLING_CACHES):
+        return tasks, 0
+    capacity = backend._max_entries
+    kept, keys = [], 0
+    for task in tasks:
+        keys += len(task[0])
+        if keys > capacity // 2:
+            break
+        kept.append(task)
+    return kept, len(tasks) - len(kept)
+
+
+class Command(BaseCommand):
+    help = ('Fills the catalog caches after a deploy or cache flush: the product index, the category list, '
+            'every category page (sync and async payloads) and the detail of the most popular products. '
+            'Work runs on a bounded thread pool and stops being scheduled once --budget seconds have passed. '
+            'The list endpoints are not paginated, so each list is a single cache entry. At most half of the '
+            "default cache's MAX_ENTRIES is warmed, so the cache does not cull what it just filled.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500, help='Most popular products to warm.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--budget', type=float, default=60, help='Seconds.')
+        parser.add_argument('--host', default=None,
+                            help='Host the warming requests are made for. Defaults to the first concrete '
+                                 'entry in ALLOWED_HOSTS; required when there is none.')
+        parser.add_argument('--https', action='store_true')
+
+    def handle(self, *args, **options):
+        host = options['host'] or default_host()
+        if host is None:
+            raise CommandError('No host to warm for: pass --host or list the public host in ALLOWED_HOSTS.')
+        factory = RequestFactory(HTTP_HOST=host)
+        secure = options['https']
+
+        def get(path):
+            return factory.get(path, secure=secure)
+
+        def check(response):
+            if response.status_code != 200:
+                raise RuntimeError(f'status {response.status_code}')
+
+        tasks = [
+            (['all_products'], all_products_queryset),
+            (['all_products_payload'],
+             lambda: async_to_sync(async_views.product_list_payload)(get('/texnomart-uz/async/'))),
+            (['category_list'], lambda: check(category_view(get('/texnomart-uz/categories/')))),
+            (['category_list_payload'],
+             lambda: check(async_to_sync(async_views.category_list)(get('/texnomart-uz/async/categories/')))),
+        ]
+        for slug in Category.objects.order_by('-product_count').values_list('slug', flat=True):
+            sync_key, payload_key = category_products_cache_keys(slug)
+            tasks += [
+                ([sync_key], lambda slug=slug: check(category_products_view(get(f'/texnomart-uz/category/{slug}/'),
+                                                                            slug=slug))),
+                ([payload_key], lambda slug=slug: check(async_to_sync(async_views.category_products)(
+                    get(f'/texnomart-uz/async/category/{slug}/'), slug))),
+            ]
+        for pk in Product.objects.order_by('-popularity').values_list('pk', flat=True)[:options['products']]:
+            tasks.append(([product_detail_cache_key(pk)], lambda pk=pk: check(product_detail_view(
+                get(f'/texnomart-uz/product/detail/{pk}/'), pk=pk))))
+
+        tasks, over_capacity = within_capacity(tasks)
+
+        start = time.monotonic()
+        deadline = start + options['budget']
+        counts = {'already_warm': 0, 'failed': 0, 'skipped': 0}
+        loaded = []
+
+        def run(keys, load):
+            try:
+                if all(cache.has_key(key) for key in keys):
+                    return 'already_warm', keys
+                load()
+                return 'warmed', keys
+            finally:
+                # Each pool thread opens its own connections.
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            running = set()
+            for keys, load in tasks:
+                if time.monotonic() >= deadline:
+                    # Tasks already running are allowed to finish.
+                    counts['skipped'] += 1
+                    continue
+                running.add(executor.submit(run, keys, load))
+                if len(running) >= options['workers'] * 2:
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    self.collect(done, counts, loaded)
+            self.collect(running, counts, loaded)
+
+        # Counted once every load is done: a key set early can still be culled by a later one.
+        warmed = sum(cache.has_key(key) for key in loaded)
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {warmed} cache keys in {time.monotonic() - start:.1f}s "
+            f"({counts['already_warm']} already warm, {counts['failed']} failed, "
+            f"{counts['skipped']} skipped by the {options['budget']:g}s budget, "
+            f"{over_capacity} left out to fit the cache)."
+        ))
+
+    def collect(self, futures, counts, loaded):
+        for future in futures:
+            try:
+                outcome, keys = future.result()
+            except Exception as exc:
+                counts['failed'] += 1
+                self.stderr.write(f'warming failed: {exc!r}')
+                continue
+            if outcome == 'warmed':
+                loaded.extend(keys)
+            else:
+                counts[outcome] += len(keys)
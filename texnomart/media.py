@@ -0,0 +1,151 @@
+import mimetypes
+import os
+import re
+import stat
+from collections import Counter
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Count
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from texnomart.models import Category, Image
+from texnomart.storage import is_content_addressed
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Every model field that can point at a stored file; references are counted with
+# indexed lookups on these columns.
+MEDIA_FIELDS = [(Image, 'image'), (Category, 'image')]
+
+
+def reference_counts(names):
+    names = list(set(names))
+    counts = Counter()
+    for model, field in MEDIA_FIELDS:
+        for offset in range(0, len(names), 500):
+            rows = model._base_manager.filter(**{f'{field}__in': names[offset:offset + 500]}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values_list(field, 'total')
+            counts.update(dict(rows))
+    return counts
+
+
+def referenced_names(names):
+    return set(reference_counts(names))
+
+
+def all_referenced_names():
+    names = set()
+    for model, field in MEDIA_FIELDS:
+        names.update(model._base_manager.exclude(**{field: ''}).values_list(field, flat=True).distinct().iterator())
+    return names
+
+
+def media_etag(name, file_stat):
+    # A content-addressed name already is a strong validator.
+    if is_content_addressed(name):
+        return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+    return '"%x-%x"' % (int(file_stat.st_mtime), file_stat.st_size)
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    return not was_modified_since(request.headers.get('If-Modified-Since'), int(mtime))
+
+
+def parse_range(header, size):
+    # Single byte ranges only; anything else is answered with the full file, as RFC 9110 allows.
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        # Not a valid byte range at all, so the header is ignored rather than answered with 416.
+        return None
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Media file not found.')
+    if not stat.S_ISREG(file_stat.st_mode) or os.path.basename(path).startswith('.'):
+        raise Http404('Media file not found.')
+
+    etag = media_etag(path, file_stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(file_stat.st_mtime),
+        'Cache-Control': (IMMUTABLE_CACHE_CONTROL if is_content_addressed(path)
+                          else f'public, max-age={settings.MEDIA_CACHE_SECONDS}'),
+        'Accept-Ranges': 'bytes',
+    }
+    if not_modified(request, etag, file_stat.st_mtime):
+        return HttpResponseNotModified(headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # Offloading: the worker only answers with headers and the front proxy sends the bytes,
+    # handling Range itself.
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        return response
+    if settings.MEDIA_SENDFILE_HEADER:
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response[settings.MEDIA_SENDFILE_HEADER] = full_path
+        return response
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range in (etag, headers['Last-Modified'])):
+        try:
+            byte_range = parse_range(range_header, file_stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416, headers=headers)
+            response['Content-Range'] = f'bytes */{file_stat.st_size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(read_range(full_path, start, end - start + 1),
+                                             status=206, content_type=content_type, headers=headers)
+            response['Content-Range'] = f'bytes {start}-{end}/{file_stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+            return response
+
+    # FileResponse hands the open file to the server's wsgi.file_wrapper, which uses sendfile().
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, Http404
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CACHE_KEY_FAMILIES = (
+    'all_products_payload', 'all_products', 'category_list_payload', 'category_list', 'attribute_keys',
+    'attribute_values', 'category_products_payload_', 'category_products_', 'product_detail_',
+)
+
+enabled = False
+current_request = ContextVar('metrics_current_request', default=None)
+
+
+class RequestStats:
+    __slots__ = ('view', 'queries', 'query_time')
+
+    def __init__(self):
+        self.view = 'unmatched'
+        self.queries = 0
+        self.query_time = 0.0
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.request_duration = defaultdict(Histogram)
+        self.serializer_duration = defaultdict(Histogram)
+        self.db_queries = defaultdict(int)
+        self.db_query_seconds = defaultdict(float)
+        self.cache_requests = defaultdict(int)
+
+    def observe_request(self, view, method, status, duration, stats):
+        with self.lock:
+            self.request_duration[(view, method, str(status))].observe(duration)
+            self.db_queries[(view,)] += stats.queries
+            self.db_query_seconds[(view,)] += stats.query_time
+
+    def observe_serializer(self, view, serializer, duration):
+        with self.lock:
+            self.serializer_duration[(view, serializer)].observe(duration)
+
+    def observe_cache(self, family, result):
+        with self.lock:
+            self.cache_requests[(family, result)] += 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            render_histogram(lines, 'texnomart_request_duration_seconds', 'Request latency by URL name.',
+                             ('view', 'method', 'status'), self.request_duration)
+            render_counter(lines, 'texnomart_db_queries_total', 'ORM queries executed by URL name.',
+                           ('view',), self.db_queries)
+            render_counter(lines, 'texnomart_db_query_seconds_total', 'Time spent in ORM queries by URL name.',
+                           ('view',), self.db_query_seconds)
+            render_counter(lines, 'texnomart_cache_requests_total', 'Cache lookups by key family and result.',
+                           ('family', 'result'), self.cache_requests)
+            render_histogram(lines, 'texnomart_serializer_duration_seconds', 'Serializer time by URL name.',
+                             ('view', 'serializer'), self.serializer_duration)
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render_counter(lines, name, help_text, label_names, values):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    lines += [f'{name}{format_labels(label_names, labels)} {value}' for labels, value in sorted(values.items())]
+
+
+def render_histogram(lines, name, help_text, label_names, histograms):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(label_names, labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_bucket{format_labels(label_names, labels, le="+Inf")} {histogram.count}')
+        lines.append(f'{name}_sum{format_labels(label_names, labels)} {histogram.sum}')
+        lines.append(f'{name}_count{format_labels(label_names, labels)} {histogram.count}')
+
+
+registry = Registry()
+
+
+def cache_key_family(cache_key):
+    for family in CACHE_KEY_FAMILIES:
+        if family.endswith('_') and cache_key.startswith(family):
+            return f'{family}*'
+        if cache_key == family:
+            return family
+    return 'other'
+
+
+def record_cache(cache_key, hit):
+    if enabled:
+        registry.observe_cache(cache_key_family(cache_key), 'hit' if hit else 'miss')
+
+
+@contextmanager
+def _serializer_timer(serializer):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_request.get()
+        registry.observe_serializer(stats.view if stats else 'unmatched', serializer, time.perf_counter() - start)
+
+
+def serializer_timer(serializer):
+    return _serializer_timer(serializer) if enabled else nullcontext()
+
+
+def query_wrapper(execute, sql, params, many, context):
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def enable():
+    global enabled
+    if enabled:
+        return
+    enabled = True
+    connection_created.connect(install_query_wrapper, dispatch_uid='texnomart_metrics_query_wrapper')
+    for connection in connections.all(initialized_only=True):
+        install_query_wrapper(None, connection)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        enable()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_request.get()
+        if stats is not None:
+            stats.view = request.resolver_match.view_name
+
+    def observe(self, request, response, stats, duration):
+        registry.observe_request(stats.view, request.method, response.status_code, duration, stats)
+
+
+def metrics_view(request):
+    if not enabled:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0002_product_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationUpdate',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_update', serialize=False, to='texnomart.product')),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='texnomart.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='texnomart.product')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['product', '-score'], name='recommendation_score_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'recommended'), name='unique_product_recommendation')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:21
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def fill_popularity(apps, schema_editor):
+    # Same scoring as texnomart.popularity.rebuild(), frozen here so later changes to it don't alter this migration.
+    Product = apps.get_model('texnomart', 'Product')
+    Comment = apps.get_model('texnomart', 'Comment')
+    Likes = Product.user_likes.through
+    now = timezone.now()
+    scores = defaultdict(float)
+    for product_id, total in Likes.objects.values('product_id').annotate(total=Count('id')).values_list(
+            'product_id', 'total'):
+        scores[product_id] += 1.0 * total
+    for product_id, rating, created_at in Comment.objects.values_list('product_id', 'rating', 'created_at'):
+        weight = 0.5 + 0.5 * (rating - 3) if rating else 0.5
+        age_days = max((now - created_at).total_seconds(), 0) / 86400
+        scores[product_id] += weight * 0.5 ** (age_days / 7)
+    Product.objects.bulk_update(
+        [Product(pk=product_id, popularity=score) for product_id, score in scores.items()],
+        ['popularity'], batch_size=500,
+    )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0003_product_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-popularity'], name='product_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-popularity'], name='product_cat_popularity_idx'),
+        ),
+    ]
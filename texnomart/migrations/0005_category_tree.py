@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_tree(apps, schema_editor):
+    # Existing categories are all roots: each only needs its depth-0 row and its own totals.
+    Category = apps.get_model('texnomart', 'Category')
+    CategoryClosure = apps.get_model('texnomart', 'CategoryClosure')
+    Product = apps.get_model('texnomart', 'Product')
+    CategoryClosure.objects.bulk_create([
+        CategoryClosure(ancestor_id=category_id, descendant_id=category_id, depth=0)
+        for category_id in Category.objects.values_list('id', flat=True)
+    ])
+    totals = Product.objects.values('category_id').annotate(count=Count('id'), price=Sum('price'))
+    for row in totals:
+        Category.objects.filter(pk=row['category_id']).update(product_count=row['count'], product_price_sum=row['price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0004_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='texnomart.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_price_sum',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='texnomart.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='texnomart.category')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_category_closure')],
+            },
+        ),
+        migrations.RunPython(populate_tree, migrations.RunPython.noop),
+    ]
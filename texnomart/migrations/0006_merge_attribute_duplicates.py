@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:25
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, model_name, field):
+    # Rows whose text matches after whitespace normalization collapse into the oldest one.
+    Model = apps.get_model('texnomart', model_name)
+    Attribute = apps.get_model('texnomart', 'Attribute')
+    groups = defaultdict(list)
+    for pk, text in Model.objects.order_by('pk').values_list('pk', field):
+        groups[' '.join(text.split())].append(pk)
+    for text, pks in groups.items():
+        keep, duplicates = pks[0], pks[1:]
+        if duplicates:
+            Attribute.objects.filter(**{f'{field}_id__in': duplicates}).update(**{f'{field}_id': keep})
+            Model.objects.filter(pk__in=duplicates).delete()
+        Model.objects.filter(pk=keep).update(**{field: text})
+
+
+def merge_attribute_dictionary(apps, schema_editor):
+    merge_duplicates(apps, 'AttributeKey', 'key')
+    merge_duplicates(apps, 'AttributeValue', 'value')
+
+
+def fill_attributes_data(apps, schema_editor):
+    Product = apps.get_model('texnomart', 'Product')
+    Attribute = apps.get_model('texnomart', 'Attribute')
+    data = defaultdict(dict)
+    for product_id, key, value in Attribute.objects.order_by('id').values_list('product_id', 'key__key', 'value__value'):
+        data[product_id][key] = value
+    Product.objects.bulk_update(
+        [Product(pk=product_id, attributes_data=attributes) for product_id, attributes in data.items()],
+        ['attributes_data'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0005_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='attributes_data',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(merge_attribute_dictionary, migrations.RunPython.noop),
+        migrations.RunPython(fill_attributes_data, migrations.RunPython.noop),
+    ]
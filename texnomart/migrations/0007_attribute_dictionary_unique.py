@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0006_merge_attribute_duplicates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attributekey',
+            name='key',
+            field=models.CharField(max_length=300, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='attributevalue',
+            name='value',
+            field=models.CharField(max_length=300, unique=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0007_attribute_dictionary_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingMediaDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0008_pending_media_deletion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to='images/'),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to='images/'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.2 on 2026-10-19 04:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0009_media_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=300)),
+                ('discount', models.FloatField()),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('active', 'Active'), ('finished', 'Finished')], default='scheduled', editable=False, max_length=20)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='campaigns', to='texnomart.category')),
+                ('products', models.ManyToManyField(blank=True, related_name='campaigns', to='texnomart.product')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CampaignProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_discount', models.FloatField()),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='texnomart.campaign')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='campaign_snapshots', to='texnomart.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='campaign',
+            index=models.Index(fields=['status', 'starts_at'], name='campaign_status_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='campaignproduct',
+            constraint=models.UniqueConstraint(fields=('campaign', 'product'), name='unique_campaign_product'),
+        ),
+    ]
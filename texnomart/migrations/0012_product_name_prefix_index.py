@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:40
+
+from django.db import migrations
+
+# The admin's prefix search ('^name') is istartswith. SQLite runs it as a case-insensitive LIKE,
+# which only a NOCASE index can serve; PostgreSQL runs UPPER(name) LIKE UPPER(%s), which needs
+# an index on UPPER(name) with pattern operators. Neither is expressible as a portable Index.
+INDEXES = {
+    'sqlite': ('CREATE INDEX IF NOT EXISTS product_name_prefix_idx ON texnomart_product (name COLLATE NOCASE)',
+               'DROP INDEX IF EXISTS product_name_prefix_idx'),
+    'postgresql': ('CREATE INDEX IF NOT EXISTS product_name_prefix_idx '
+                   'ON texnomart_product (UPPER(name) varchar_pattern_ops)',
+                   'DROP INDEX IF EXISTS product_name_prefix_idx'),
+}
+
+
+def create_index(apps, schema_editor):
+    sql = INDEXES.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql[0])
+
+
+def drop_index(apps, schema_editor):
+    sql = INDEXES.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0011_revoked_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
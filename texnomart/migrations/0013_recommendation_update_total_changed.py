@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 05:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('texnomart', '0012_product_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationupdate',
+            name='total_changed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
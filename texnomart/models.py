@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db import models
 from django.template.defaultfilters import slugify
@@ -13,10 +14,35 @@ class BaseModel(models.Model):
         ordering = ['-created_at']
 
 
-class Category(BaseModel):
+class DenormalizedFieldsMixin:
+    # Columns kept current with F() updates and signals. A plain save() of an instance loaded
+    # before one of those updates would write its stale copy back, so saving an existing row
+    # leaves them out unless they are named in update_fields.
+    denormalized_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skipped = {*self.denormalized_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in skipped
+                                       and field.attname not in skipped]
+        super().save(*args, **kwargs)
+
+
+class Category(DenormalizedFieldsMixin, BaseModel):
     title = models.CharField(max_length=300, unique=True)
     slug = models.SlugField(max_length=300, blank=True, unique=True)
-    image = models.ImageField(upload_to='images/', blank=False)
+    image = models.ImageField(upload_to='images/', blank=False, db_index=True)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    # Products filed directly under this category; subtree totals are summed over the closure.
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    product_price_sum = models.FloatField(default=0, editable=False)
+    denormalized_fields = ('product_count', 'product_price_sum')
+
+    def clean(self):
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(
+                ancestor_id=self.pk, descendant_id=self.parent_id).exists():
+            raise ValidationError({'parent': 'A category cannot be moved under its own subcategory.'})
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -27,7 +53,22 @@ class Category(BaseModel):
         return self.title
 
 
-class Product(BaseModel):
+class CategoryClosure(models.Model):
+    # One row per (ancestor, descendant) pair, including each category paired with itself at depth 0.
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_category_closure'),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} -> {self.descendant_id} ({self.depth})'
+
+
+class Product(DenormalizedFieldsMixin, BaseModel):
     name = models.CharField(max_length=300)
     slug = models.SlugField(max_length=300, blank=True)
     price = models.FloatField()
@@ -35,6 +76,17 @@ class Product(BaseModel):
     user_likes = models.ManyToManyField(User, related_name='likes', blank=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     discount = models.FloatField(default=0)
+    popularity = models.FloatField(default=0, editable=False)
+    # {key: value} copy of the product's Attribute rows, maintained by signals.
+    attributes_data = models.JSONField(default=dict, blank=True, editable=False)
+    denormalized_fields = ('popularity', 'attributes_data')
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            models.Index(fields=['-created_at'], name='product_created_at_idx'),
+            models.Index(fields=['-popularity'], name='product_popularity_idx'),
+            models.Index(fields=['category', '-popularity'], name='product_cat_popularity_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -56,7 +108,7 @@ class Product(BaseModel):
 
 
 class Image(BaseModel):
-    image = models.ImageField(upload_to='images/')
+    image = models.ImageField(upload_to='images/', db_index=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     is_primary = models.BooleanField(default=False)
 
@@ -65,14 +117,14 @@ class Image(BaseModel):
 
 
 class AttributeValue(BaseModel):
-    value = models.CharField(max_length=300)
+    value = models.CharField(max_length=300, unique=True)
 
     def __str__(self):
         return self.value
 
 
 class AttributeKey(BaseModel):
-    key = models.CharField(max_length=300)
+    key = models.CharField(max_length=300, unique=True)
 
     def __str__(self):
         return self.key
@@ -103,3 +155,88 @@ class Comment(BaseModel):
 
     def __str__(self):
         return f'Comment by {self.user.username} on {self.product.name}'
+
+
+class ProductRecommendation(BaseModel):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'recommended'], name='unique_product_recommendation'),
+        ]
+        indexes = [models.Index(fields=['product', '-score'], name='recommendation_score_idx')]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.recommended_id} ({self.score:.3f})'
+
+
+class RecommendationUpdate(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='recommendation_update')
+    queued_at = models.DateTimeField(auto_now_add=True)
+    # The product's own interaction count changed; every neighbour's score depends on it, so
+    # compute_recommendations queues the neighbours as well.
+    total_changed = models.BooleanField(default=False)
+
+
+class PendingMediaDeletion(models.Model):
+    # Files left behind by bulk deletes; purge_media removes the ones nothing references any more.
+    name = models.CharField(max_length=500)
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RevokedToken(models.Model):
+    # Refresh tokens revoked by logout, until they would have expired anyway; see texnomart.revocation.
+    jti = models.CharField(max_length=255, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class Campaign(BaseModel):
+    # A timed discount on a category subtree, a hand-picked product set, or (with neither) the
+    # whole store. run_campaigns applies and reverts it; see texnomart.campaigns.
+    class Status(models.TextChoices):
+        SCHEDULED = 'scheduled'
+        ACTIVE = 'active'
+        FINISHED = 'finished'
+
+    name = models.CharField(max_length=300)
+    discount = models.FloatField()
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='campaigns')
+    products = models.ManyToManyField(Product, blank=True, related_name='campaigns')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.SCHEDULED, editable=False)
+
+    class Meta(BaseModel.Meta):
+        indexes = [models.Index(fields=['status', 'starts_at'], name='campaign_status_start_idx')]
+
+    def clean(self):
+        if self.discount is not None and not 0 < self.discount <= 100:
+            raise ValidationError({'discount': 'Discount must be between 0 and 100 percent.'})
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': 'A campaign must end after it starts.'})
+
+    def __str__(self):
+        return self.name
+
+
+class CampaignProduct(models.Model):
+    # The discount each product had when its campaign started, restored when it ends.
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='snapshot')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='campaign_snapshots')
+    previous_discount = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'product'], name='unique_campaign_product'),
+        ]
@@ -0,0 +1,44 @@
+from django.core.paginator import Paginator
+from django.db import connections, router, DatabaseError
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model):
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            elif connection.vendor == 'sqlite':
+                # Row counts collected by ANALYZE; MAX(rowid) is a b-tree seek and close enough otherwise.
+                # sqlite_stat1 only exists once ANALYZE has run, and querying a missing table would fail
+                # the statement (and any transaction around it), so look it up first.
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone():
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                    row = cursor.fetchone()
+                    if row:
+                        return int(row[0].split()[0])
+                cursor.execute(f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}')
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return int(row[0]) if row and row[0] is not None else None
+
+
+# Uses the planner's row estimate instead of COUNT(*) for unfiltered querysets over
+# `approximate_above` rows; filtered or small result sets are still counted exactly.
+class ApproximateCountPaginator(Paginator):
+    approximate_above = 10000
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where and not query.distinct and not query.low_mark and query.high_mark is None:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate > self.approximate_above:
+                return estimate
+        return super().count
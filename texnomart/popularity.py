@@ -0,0 +1,84 @@
+from collections import defaultdict
+
+from django.db.models import F, Count, FloatField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from texnomart.models import Product, Comment
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.5
+RATING_WEIGHT = 0.5
+NEUTRAL_RATING = 3
+HALF_LIFE_DAYS = 7
+
+
+def comment_weight(rating):
+    # Rating 0 is the "not rated" default, so such comments only count as engagement.
+    if not rating:
+        return COMMENT_WEIGHT
+    return COMMENT_WEIGHT + RATING_WEIGHT * (rating - NEUTRAL_RATING)
+
+
+def daily_decay_factor(half_life_days=HALF_LIFE_DAYS):
+    return 0.5 ** (1 / half_life_days)
+
+
+def comment_contribution(rating, created_at, now=None, half_life_days=HALF_LIFE_DAYS):
+    # What a comment adds to popularity today: its weight decayed by its age, the same figure rebuild() computes.
+    age_days = max(((now or timezone.now()) - created_at).total_seconds(), 0) / 86400
+    return comment_weight(rating) * 0.5 ** (age_days / half_life_days)
+
+
+def like_score():
+    # Likes carry no timestamp, so they count at full weight for as long as they exist and only
+    # the comment part of a score decays.
+    likes = Product.user_likes.through.objects.filter(product_id=OuterRef('pk')).values('product_id').annotate(
+        total=Count('id')
+    ).values('total')
+    return Coalesce(Subquery(likes), 0, output_field=FloatField()) * Value(LIKE_WEIGHT)
+
+
+def bump(product_ids, delta):
+    if product_ids and delta:
+        Product.objects.filter(pk__in=list(product_ids)).update(popularity=F('popularity') + delta)
+
+
+def pk_ranges(batch_size):
+    last = Product.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last, batch_size):
+        yield start, start + batch_size
+
+
+def decay(factor, batch_size=5000):
+    # Chunked by primary key so a large catalog never holds the write lock for long.
+    updated = 0
+    for start, end in pk_ranges(batch_size):
+        updated += Product.objects.filter(pk__gt=start, pk__lte=end).update(
+            popularity=like_score() + (F('popularity') - like_score()) * factor
+        )
+    return updated
+
+
+def rebuild(batch_size=5000, half_life_days=HALF_LIFE_DAYS):
+    now = timezone.now()
+    Likes = Product.user_likes.through
+    updated = 0
+    for start, end in pk_ranges(batch_size):
+        scores = defaultdict(float)
+        likes = Likes.objects.filter(product_id__gt=start, product_id__lte=end).values('product_id').annotate(
+            total=Count('id')
+        ).values_list('product_id', 'total')
+        for product_id, total in likes:
+            scores[product_id] += LIKE_WEIGHT * total
+        comments = Comment.objects.filter(product_id__gt=start, product_id__lte=end).values_list(
+            'product_id', 'rating', 'created_at'
+        )
+        for product_id, rating, created_at in comments:
+            scores[product_id] += comment_contribution(rating, created_at, now, half_life_days)
+
+        products = list(Product.objects.filter(pk__gt=start, pk__lte=end).only('pk', 'popularity'))
+        for product in products:
+            product.popularity = scores.get(product.pk, 0.0)
+        updated += Product.objects.bulk_update(products, ['popularity'], batch_size=500)
+    return updated
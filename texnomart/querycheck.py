@@ -0,0 +1,181 @@
+import functools
+import logging
+import re
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('texnomart.queries')
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+current_report = ContextVar('querycheck_current_report', default=None)
+explaining = ContextVar('querycheck_explaining', default=False)
+
+
+def sql_shape(sql):
+    shape = STRING_RE.sub('?', sql)
+    shape = IN_LIST_RE.sub('IN (...)', shape)
+    return NUMBER_RE.sub('?', shape)
+
+
+def query_origin():
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(base_dir) and frame.filename != __file__ and 'site-packages' not in frame.filename:
+            return f'{frame.filename[len(base_dir) + 1:]}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryShape:
+    __slots__ = ('sql', 'count', 'duration', 'origin')
+
+    def __init__(self, sql, origin):
+        self.sql = sql
+        self.count = 0
+        self.duration = 0.0
+        self.origin = origin
+
+
+class QueryReport:
+    def __init__(self, threshold=None, slow_ms=None):
+        self.threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+        self.slow_ms = slow_ms if slow_ms is not None else settings.SLOW_QUERY_MS
+        self.shapes = {}
+        self.slow = []
+
+    def record(self, connection, sql, params, duration):
+        shape = sql_shape(sql)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = QueryShape(sql, query_origin())
+        entry.count += 1
+        entry.duration += duration
+        if self.slow_ms and duration * 1000 >= self.slow_ms:
+            plan = explain(connection, sql, params)
+            self.slow.append((sql, duration, plan))
+            logger.warning('Slow query (%.1f ms) from %s:\n%s\nPlan:\n%s',
+                           duration * 1000, entry.origin, sql, plan)
+
+    @property
+    def repeated(self):
+        return sorted((shape for shape in self.shapes.values() if shape.count >= self.threshold),
+                      key=lambda shape: -shape.count)
+
+    def describe(self):
+        return '\n'.join(
+            f'{shape.count}x ({shape.duration * 1000:.1f} ms) from {shape.origin}: {shape.sql[:300]}'
+            for shape in self.repeated
+        )
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return '(not a SELECT)'
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    token = explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'(EXPLAIN failed: {e})'
+    finally:
+        explaining.reset(token)
+
+
+def make_wrapper(connection):
+    def wrapper(execute, sql, params, many, context):
+        report = current_report.get()
+        if report is None or explaining.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            report.record(connection, sql, None if many else params, time.perf_counter() - start)
+
+    wrapper.querycheck = True
+    return wrapper
+
+
+def install_wrapper(sender, connection, **kwargs):
+    if not any(getattr(wrapper, 'querycheck', False) for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.append(make_wrapper(connection))
+
+
+def install():
+    connection_created.connect(install_wrapper, dispatch_uid='texnomart_querycheck_wrapper')
+    for connection in connections.all():
+        install_wrapper(None, connection)
+
+
+@contextmanager
+def inspect_queries(threshold=None, slow_ms=None):
+    install()
+    report = QueryReport(threshold, slow_ms)
+    token = current_report.set(report)
+    try:
+        yield report
+    finally:
+        current_report.reset(token)
+
+
+# Test decorator, or a context manager when used without a function: fails when any
+# SQL shape runs at least `threshold` times.
+def assert_no_n_plus_one(func=None, *, threshold=None):
+    @contextmanager
+    def check():
+        with inspect_queries(threshold, slow_ms=0) as report:
+            yield report
+        if report.repeated:
+            raise AssertionError(f'Repeated queries (possible N+1):\n{report.describe()}')
+
+    if func is None:
+        return check()
+
+    @functools.wraps(func)
+    def wrapped(*args, **kwargs):
+        with check():
+            return func(*args, **kwargs)
+
+    return wrapped
+
+
+class QueryInspectionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with inspect_queries() as report:
+            response = self.get_response(request)
+        self.log(request, report)
+        return response
+
+    async def __acall__(self, request):
+        with inspect_queries() as report:
+            response = await self.get_response(request)
+        self.log(request, report)
+        return response
+
+    def log(self, request, report):
+        if report.repeated:
+            logger.warning('Possible N+1 on %s %s:\n%s', request.method, request.path, report.describe())
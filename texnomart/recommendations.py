@@ -0,0 +1,128 @@
+import math
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from texnomart.models import Product, Comment, ProductRecommendation, RecommendationUpdate
+
+LIKES_TABLE = Product.user_likes.through._meta.db_table
+COMMENT_TABLE = Comment._meta.db_table
+POSITIVE_RATING = 4
+
+
+def queue_products(product_ids, total_changed=()):
+    # Queuing an already queued product moves its queued_at forward, so a run that read the
+    # interactions before this call leaves the row for the next one (see unqueue()).
+    RecommendationUpdate.objects.bulk_create(
+        [RecommendationUpdate(product_id=product_id) for product_id in {*product_ids, *total_changed}],
+        update_conflicts=True, unique_fields=['product'], update_fields=['queued_at']
+    )
+    if total_changed:
+        RecommendationUpdate.objects.filter(product_id__in=set(total_changed)).update(total_changed=True)
+
+
+def queue_user_interaction(user_id, product_ids):
+    # A new or removed interaction (u, p) changes the co-occurrence of p with every
+    # other product u interacted with, so all of them need fresh neighbours.
+    liked = Product.user_likes.through.objects.filter(user_id=user_id).values_list('product_id', flat=True)
+    rated = Comment.objects.filter(user_id=user_id, rating__gte=POSITIVE_RATING).values_list('product_id', flat=True)
+    queue_products([*liked, *rated], total_changed=product_ids)
+
+
+def queue_neighbours(with_ratings, chunk_size=500):
+    # Products whose interaction count changed appear in their neighbours' lists with a score
+    # built from that count. The flag is cleared first, so a change arriving meanwhile sets it
+    # again for the next run.
+    queued = 0
+    while True:
+        changed = list(RecommendationUpdate.objects.filter(total_changed=True).order_by('pk').values_list(
+            'pk', flat=True)[:chunk_size])
+        if not changed:
+            return queued
+        RecommendationUpdate.objects.filter(pk__in=changed).update(total_changed=False)
+        source = interactions_source(with_ratings)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT DISTINCT y.product_id FROM {source} AS x JOIN {source} AS y ON x.user_id = y.user_id '
+                f'WHERE x.product_id IN ({", ".join(["%s"] * len(changed))})',
+                changed,
+            )
+            neighbours = [row[0] for row in cursor.fetchall()]
+        queue_products(neighbours)
+        queued += len(neighbours)
+
+
+def unqueue(product_ids, started_at):
+    # Only rows queued before the run read the interactions. A row still flagged total_changed
+    # stays too, so the next run requeues its neighbours.
+    RecommendationUpdate.objects.filter(
+        product_id__in=product_ids, queued_at__lte=started_at, total_changed=False
+    ).delete()
+
+
+def interactions_source(with_ratings):
+    # Plain likes are read straight from the through table so the joins use its
+    # (product_id, user_id) and user_id indexes.
+    if not with_ratings:
+        return LIKES_TABLE
+    return (f'(SELECT user_id, product_id FROM {LIKES_TABLE} UNION '
+            f'SELECT user_id, product_id FROM {COMMENT_TABLE} WHERE rating >= {POSITIVE_RATING})')
+
+
+def top_neighbours(product_ids, top_k, metric, with_ratings, min_common=1):
+    source = interactions_source(with_ratings)
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    # Both orderings are monotonic in the final score: cosine is ranked by its square
+    # so the database needs no sqrt().
+    if metric == 'jaccard':
+        rank = 'pairs.common * 1.0 / (a.total + b.total - pairs.common)'
+    else:
+        rank = 'pairs.common * pairs.common * 1.0 / (a.total * b.total)'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH pairs AS ('
+            f'  SELECT x.product_id AS product_id, y.product_id AS other_id, COUNT(*) AS common'
+            f'  FROM {source} AS x JOIN {source} AS y ON x.user_id = y.user_id AND x.product_id <> y.product_id'
+            f'  WHERE x.product_id IN ({placeholders})'
+            f'  GROUP BY x.product_id, y.product_id HAVING COUNT(*) >= %s'
+            f'), totals AS ('
+            # Only the batch and its candidate neighbours, through the product_id index.
+            f'  SELECT product_id, COUNT(*) AS total FROM {source} AS interactions'
+            f'  WHERE product_id IN (SELECT other_id FROM pairs UNION SELECT product_id FROM pairs)'
+            f'  GROUP BY product_id'
+            f'), ranked AS ('
+            f'  SELECT pairs.product_id, pairs.other_id, pairs.common, a.total AS total_a, b.total AS total_b,'
+            f'    ROW_NUMBER() OVER (PARTITION BY pairs.product_id ORDER BY {rank} DESC, pairs.other_id) AS position'
+            f'  FROM pairs JOIN totals a ON a.product_id = pairs.product_id'
+            f'  JOIN totals b ON b.product_id = pairs.other_id'
+            f') SELECT product_id, other_id, common, total_a, total_b FROM ranked WHERE position <= %s',
+            [*product_ids, min_common, top_k],
+        )
+        return cursor.fetchall()
+
+
+def similarity(common, count_a, count_b, metric):
+    if metric == 'jaccard':
+        return common / (count_a + count_b - common)
+    return common / math.sqrt(count_a * count_b)
+
+
+def rebuild(product_ids, top_k, metric, with_ratings, min_common=1):
+    started_at = timezone.now()
+    rows = [
+        ProductRecommendation(product_id=product_id, recommended_id=other_id,
+                              score=similarity(common, total_a, total_b, metric))
+        for product_id, other_id, common, total_a, total_b
+        in top_neighbours(product_ids, top_k, metric, with_ratings, min_common)
+    ]
+    with transaction.atomic():
+        ProductRecommendation.objects.filter(product_id__in=product_ids).delete()
+        ProductRecommendation.objects.bulk_create(rows)
+        unqueue(product_ids, started_at)
+    return len(rows)
+
+
+def interacting_products(with_ratings):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT DISTINCT product_id FROM {interactions_source(with_ratings)} AS interactions')
+        return {row[0] for row in cursor.fetchall()}
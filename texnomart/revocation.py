@@ -0,0 +1,42 @@
+import itertools
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from texnomart.models import RevokedToken
+
+
+# Revoked refresh tokens are rows keyed by jti, so every worker sees them and nothing evicts one
+# before its token expires. Logout is one INSERT and the refresh check one primary-key lookup.
+# Every REVOKED_TOKEN_PRUNE_EVERY revocations a worker also deletes one batch of expired rows
+# through the expires_at index. A batch is larger than the rows inserted in between, so the table
+# stays bounded without cron; prune_revoked_tokens clears a backlog in one go.
+revocations = itertools.count(1)
+
+
+def revoke(token):
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    if expires_at > timezone.now():
+        RevokedToken.objects.bulk_create([RevokedToken(jti=token[api_settings.JTI_CLAIM], expires_at=expires_at)],
+                                         ignore_conflicts=True)
+    if next(revocations) % settings.REVOKED_TOKEN_PRUNE_EVERY == 0:
+        prune_revoked_tokens(settings.REVOKED_TOKEN_PRUNE_BATCH, max_batches=1)
+
+
+def is_revoked(token):
+    return RevokedToken.objects.filter(jti=token[api_settings.JTI_CLAIM], expires_at__gt=timezone.now()).exists()
+
+
+def prune_revoked_tokens(batch_size=10000, max_batches=None):
+    # Batches keep each write transaction short for the readers.
+    removed = 0
+    for _ in itertools.repeat(None) if max_batches is None else range(max_batches):
+        expired = list(RevokedToken.objects.filter(expires_at__lte=timezone.now()).values_list(
+            'jti', flat=True)[:batch_size])
+        if not expired:
+            return removed
+        removed += RevokedToken.objects.filter(jti__in=expired).delete()[0]
+    return removed
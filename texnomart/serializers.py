@@ -1,10 +1,24 @@
 from django.contrib.auth.models import User
 from rest_framework.exceptions import ValidationError
 from rest_framework import serializers
-from .models import Product, Category, AttributeValue, AttributeKey
+from rest_framework.validators import UniqueValidator
+from .attributes import normalize
+from .metrics import serializer_timer
+from .models import Product, Category, CategoryClosure, AttributeValue, AttributeKey
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    @property
+    def data(self):
+        with serializer_timer(type(getattr(self, 'child', self)).__name__):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
     user_likes = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
@@ -18,29 +32,43 @@ class ProductSerializer(serializers.ModelSerializer):
     def get_image(self, obj):
         request = self.context.get('request')
         image = next((img for img in obj.images.all() if img.is_primary), None)
-        return request.build_absolute_uri(image.image.url) if image else None
+        if not image:
+            return None
+        # Cached async payloads are serialized without a request and keep the path relative.
+        return request.build_absolute_uri(image.image.url) if request else image.image.url
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'slug', 'price', 'discounted_price', 'discount', 'user_likes', 'image', 'monthly_pay',
                   'category', 'created_at']
+        list_serializer_class = TimedListSerializer
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image_of_category = serializers.SerializerMethodField()
     product_count = serializers.IntegerField(source='products_count', read_only=True)
     total_price_of_products = serializers.IntegerField(source='products_price_sum', read_only=True)
 
     def get_image_of_category(self, obj):
         request = self.context.get('request')
-        return request.build_absolute_uri(obj.image.url) if request and obj.image else None
+        if not obj.image:
+            return None
+        return request.build_absolute_uri(obj.image.url) if request else obj.image.url
+
+    def validate_parent(self, parent):
+        if parent and self.instance and CategoryClosure.objects.filter(
+                ancestor=self.instance, descendant=parent).exists():
+            raise serializers.ValidationError('A category cannot be moved under its own subcategory.')
+        return parent
 
     class Meta:
         model = Category
-        fields = '__all__'
+        # product_count above is the subtree total; the denormalized columns behind it stay internal.
+        exclude = ['product_price_sum']
+        list_serializer_class = TimedListSerializer
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     images = serializers.SerializerMethodField()
     user_likes = serializers.SerializerMethodField()
     comments = serializers.SerializerMethodField()
@@ -48,17 +76,18 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     attributes = serializers.SerializerMethodField()
 
     def get_attributes(self, obj):
-        return {attr.key.key: attr.value.value for attr in obj.attributes.all()}
+        return obj.attributes_data
 
     def get_images(self, obj):
+        # Serialized without a request for the detail cache, which keeps the paths relative.
         request = self.context.get('request')
-        return [request.build_absolute_uri(img.image.url) for img in obj.images.all()] if obj.images.exists() else []
+        return [request.build_absolute_uri(img.image.url) if request else img.image.url for img in obj.images.all()]
 
     def get_user_likes(self, obj):
-        return bool(obj.user_likes_prefetched)
+        return hasattr(obj, 'user_liked') and bool(obj.user_liked)
 
     def get_comments(self, obj):
-        comments = obj.comments.select_related('user').all()
+        comments = obj.comments.all()
         return [
             {
                 comment.user.username: {
@@ -75,16 +104,29 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = '__all__'
+        # popularity changes through update() without touching the cached detail, so it stays internal
+        # as on the product list.
+        exclude = ['attributes_data', 'popularity']
+        list_serializer_class = TimedListSerializer
+
+
+class NormalizedCharField(serializers.CharField):
+    # Normalizes before validators run, so the uniqueness check sees the text that gets stored.
+    def to_internal_value(self, data):
+        return normalize(super().to_internal_value(data))
 
 
 class AttributeKeySerializer(serializers.ModelSerializer):
+    key = NormalizedCharField(max_length=300, validators=[UniqueValidator(AttributeKey.objects.all())])
+
     class Meta:
         model = AttributeKey
         fields = ['id', 'key', 'created_at']
 
 
 class AttributeValueSerializer(serializers.ModelSerializer):
+    value = NormalizedCharField(max_length=300, validators=[UniqueValidator(AttributeValue.objects.all())])
+
     class Meta:
         model = AttributeValue
         fields = ['id', 'value', 'created_at']
@@ -1,12 +1,24 @@
+import copy
 import json
 import os
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.mail import send_mail
-from django.db.models.signals import post_save, pre_delete, post_delete
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.utils import timezone
 
-from .models import Product, Category
+from .authentication import forget_user
+from .attributes import refresh_attributes_data
+from .caching import invalidate_product_detail, invalidate_catalog, invalidate_product_lists
+from .campaigns import end_campaign
+from .categories import link_category, move_category, adjust_product_totals
+from .models import Product, Category, CategoryClosure, Image, Comment, Attribute, AttributeKey, AttributeValue, \
+    Campaign
+from .popularity import bump as bump_popularity, comment_contribution, LIKE_WEIGHT
+from .recommendations import queue_user_interaction, POSITIVE_RATING
+from .suggest import suggester
 
 
 @receiver(post_save, sender=Product)
@@ -53,7 +65,7 @@ def product_pre_delete(sender, instance, **kwargs):
 
     file_path = os.path.join(directory, f'{instance.name}_id_{instance.id}.json')
 
-    images = [image.url for image in instance.images.all()]
+    images = [image.image.url for image in instance.images.all()]
     category = instance.category.title if instance.category else None
 
     data = {
@@ -93,3 +105,219 @@ def category_pre_delete(sender, instance, **kwargs):
             json.dump(data, f, indent=4)
     except IOError as e:
         raise e
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_detail_invalidate(sender, instance, **kwargs):
+    invalidate_product_detail(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_lists_invalidate(sender, instance, **kwargs):
+    # Sync querysets and async payloads alike, including the old category's pages after a move.
+    previous = getattr(instance, '_previous_totals', None)
+    invalidate_product_lists({instance.category_id, previous[0] if previous else instance.category_id})
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_lists_invalidate(sender, instance, **kwargs):
+    # List items carry the primary image.
+    category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+    if category_id:
+        invalidate_product_lists({category_id})
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+def product_related_invalidate(sender, instance, **kwargs):
+    invalidate_product_detail(instance.product_id)
+
+
+@receiver(post_save, sender=AttributeKey)
+@receiver(post_save, sender=AttributeValue)
+def attribute_dictionary_invalidate(sender, instance, **kwargs):
+    lookup = 'key' if sender is AttributeKey else 'value'
+    product_ids = list(Attribute.objects.filter(**{lookup: instance}).values_list('product_id', flat=True).distinct())
+    refresh_attributes_data(product_ids)
+    invalidate_product_detail(*product_ids)
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+def attribute_data_refresh(sender, instance, **kwargs):
+    refresh_attributes_data([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.user_likes.through)
+def product_likes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        user_ids = [instance.pk]
+        product_ids = pk_set or instance.likes.values_list('id', flat=True)
+    else:
+        user_ids = pk_set or instance.user_likes.values_list('id', flat=True)
+        product_ids = [instance.pk]
+    for user_id in list(user_ids):
+        queue_user_interaction(user_id, list(product_ids))
+
+
+@receiver(post_save, sender=Comment)
+def comment_rating_changed(sender, instance, **kwargs):
+    # Queued when the comment counted as a like before the edit or counts as one after it,
+    # so a rating dropping below POSITIVE_RATING is picked up too.
+    product_ids = set()
+    previous = getattr(instance, '_previous_rating', None)
+    if previous and previous[1] >= POSITIVE_RATING:
+        product_ids.add(previous[0])
+    if instance.rating >= POSITIVE_RATING:
+        product_ids.add(instance.product_id)
+    if product_ids:
+        queue_user_interaction(instance.user_id, list(product_ids))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_rating_removed(sender, instance, **kwargs):
+    if instance.rating >= POSITIVE_RATING:
+        queue_user_interaction(instance.user_id, [instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.user_likes.through)
+def product_likes_popularity(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        related = instance.likes if reverse else instance.user_likes
+        pk_set = set(related.values_list('id', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    delta = LIKE_WEIGHT if action == 'post_add' else -LIKE_WEIGHT
+    if reverse:
+        bump_popularity(pk_set, delta)
+    else:
+        bump_popularity([instance.pk], delta * len(pk_set))
+
+
+@receiver(pre_save, sender=Comment)
+def comment_remember_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = Comment.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'rating', 'created_at'
+        ).first()
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved_popularity(sender, instance, **kwargs):
+    # Both sides are decayed by the comment's age, so an edit swaps what the old rating is worth
+    # today for what the new one is worth today instead of counting the comment as new again.
+    now = timezone.now()
+    previous = getattr(instance, '_previous_rating', None)
+    if previous:
+        product_id, rating, created_at = previous
+        bump_popularity([product_id], -comment_contribution(rating, created_at, now))
+    bump_popularity([instance.product_id], comment_contribution(instance.rating, instance.created_at, now))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted_popularity(sender, instance, **kwargs):
+    bump_popularity([instance.product_id], -comment_contribution(instance.rating, instance.created_at))
+
+
+@receiver(pre_save, sender=Category)
+def category_remember_parent(sender, instance, **kwargs):
+    instance._previous_parent = None
+    if not instance._state.adding:
+        instance._previous_parent = Category.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+        if instance.parent_id != instance._previous_parent and instance.parent_id and CategoryClosure.objects.filter(
+                ancestor_id=instance.pk, descendant_id=instance.parent_id).exists():
+            raise ValueError('A category cannot be moved under its own subcategory.')
+
+
+@receiver(post_save, sender=Category)
+def category_closure_update(sender, instance, created, **kwargs):
+    if created:
+        link_category(instance)
+    elif instance.parent_id != getattr(instance, '_previous_parent', instance.parent_id):
+        move_category(instance)
+        invalidate_catalog()
+
+
+@receiver(pre_save, sender=Product)
+def product_remember_totals(sender, instance, **kwargs):
+    instance._previous_totals = None
+    if not instance._state.adding:
+        instance._previous_totals = Product.objects.filter(pk=instance.pk).values_list('category_id', 'price').first()
+
+
+@receiver(post_save, sender=Product)
+def product_saved_totals(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_totals', None)
+    if previous:
+        category_id, price = previous
+        if category_id == instance.category_id:
+            adjust_product_totals(category_id, 0, instance.price - price)
+            return
+        adjust_product_totals(category_id, -1, -price)
+    adjust_product_totals(instance.category_id, 1, instance.price)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_totals(sender, instance, **kwargs):
+    adjust_product_totals(instance.category_id, -1, -instance.price)
+
+
+@receiver(post_save, sender=Product)
+def product_suggest_update(sender, instance, **kwargs):
+    # The in-process index only changes once the write commits, so a rollback leaves no ghost
+    # or missing entries. The copy keeps the values as saved.
+    product = copy.copy(instance)
+    transaction.on_commit(lambda: suggester.product_changed(product))
+
+
+@receiver(post_delete, sender=Product)
+def product_suggest_remove(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: suggester.product_removed(product_id))
+
+
+@receiver(post_save, sender=Category)
+def category_suggest_update(sender, instance, **kwargs):
+    category = copy.copy(instance)
+    transaction.on_commit(lambda: suggester.category_changed(category))
+
+
+@receiver(post_delete, sender=Category)
+def category_suggest_remove(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: suggester.category_removed(category_id))
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_save, sender=AttributeValue)
+@receiver(post_delete, sender=AttributeValue)
+def attribute_suggest_update(sender, instance, **kwargs):
+    transaction.on_commit(suggester.attributes_changed)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_auth_cache_invalidate(sender, instance, **kwargs):
+    # Again once the change commits: another worker can reload the old row, and cache it under
+    # the new generation, between this signal and the commit.
+    forget_user(instance.pk)
+    transaction.on_commit(lambda pk=instance.pk: forget_user(pk))
+
+
+@receiver(pre_delete, sender=Campaign)
+def campaign_pre_delete(sender, instance, **kwargs):
+    # The snapshot goes with the campaign, so a running one gives the discounts back first.
+    # Also covers campaigns removed along with their category.
+    if instance.status == Campaign.Status.ACTIVE:
+        end_campaign(instance)
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[\w]+)?$')
+
+
+def is_content_addressed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Files are named after the SHA-256 of their bytes: "images/photo.jpg" is stored as
+    # "images/ab/<sha256>.jpg". The upload is hashed while it is streamed to a temporary file
+    # next to its destination, so a duplicate is detected without reading it twice and the
+    # rename into place is atomic. Identical uploads share one file; see
+    # texnomart.media for reference counting and gc_media for cleanup.
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save().
+        return name
+
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(part for part in (directory, digest[:2], f'{digest}{extension}') if part)
+
+    def _save(self, name, content):
+        directory = self.path(os.path.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek') and getattr(content, 'seekable', lambda: True)():
+            content.seek(0)
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='.upload-', delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+
+        hashed = self.hashed_name(name, digest.hexdigest())
+        full_path = self.path(hashed)
+        try:
+            # A duplicate refreshes the shared file's mtime: gc_media --min-age and purge_media
+            # keep recently touched files, since the row about to reference this one may not be
+            # committed yet.
+            os.utime(full_path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(temporary.name, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        else:
+            os.unlink(temporary.name)
+        return hashed
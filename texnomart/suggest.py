@@ -0,0 +1,252 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count
+
+from texnomart.categories import categories_with_totals
+from texnomart.models import Product, AttributeValue
+
+APOSTROPHES = str.maketrans({'‘': "'", '’': "'", 'ʻ': "'", 'ʼ': "'", '`': "'"})
+MAX_LABEL_LENGTH = 120
+MAX_SUGGESTIONS = 20
+MEMO_SIZE = 2048
+
+
+def normalize(text):
+    return ' '.join(text.translate(APOSTROPHES).casefold().split())
+
+
+def word_suffixes(label):
+    # Every word starts a term, so "tel" finds "Samsung Televizor" and "samsung tel" still matches.
+    words = normalize(label)[:MAX_LABEL_LENGTH].split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    # Sorted (term, -score, item_id) tuples searched with bisect. Prefixes of up to three
+    # characters match too much of the index to scan per request, so their top results are
+    # kept ready and patched on every write; longer prefixes are memoized (LRU) until a
+    # write touches a term starting with them.
+    short_prefix = 3
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = []
+        self.items = {}
+        self.short = {}
+        self.memo = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, rows):
+        # rows arrive most popular first, so the budget keeps the items worth suggesting.
+        entries, items = [], {}
+        for item_id, score, label, payload in rows:
+            terms = word_suffixes(label)
+            if len(entries) + len(terms) > self.max_entries:
+                break
+            items[item_id] = (score, payload, terms)
+            entries += [(term, -score, item_id) for term in terms]
+        entries.sort()
+        short = {}
+        for term, negative_score, item_id in entries:
+            for prefix in self.short_prefixes(term):
+                short.setdefault(prefix, {})[item_id] = negative_score
+        short = {prefix: heapq.nsmallest(MAX_SUGGESTIONS, ((score, item_id) for item_id, score in matches.items()))
+                 for prefix, matches in short.items()}
+        with self.lock:
+            self.entries, self.items, self.short = entries, items, short
+            self.memo.clear()
+
+    def short_prefixes(self, term):
+        return {term[:end] for end in range(1, min(len(term), self.short_prefix) + 1)}
+
+    def put(self, item_id, score, label, payload):
+        terms = word_suffixes(label)
+        with self.lock:
+            self._remove(item_id)
+            if len(self.entries) + len(terms) > self.max_entries:
+                return
+            self.items[item_id] = (score, payload, terms)
+            for term in terms:
+                insort(self.entries, (term, -score, item_id))
+            for prefix in set().union(*map(self.short_prefixes, terms)):
+                top = self.short.setdefault(prefix, [])
+                insort(top, (-score, item_id))
+                del top[MAX_SUGGESTIONS:]
+            self._forget(terms)
+
+    def remove(self, item_id):
+        with self.lock:
+            self._remove(item_id)
+
+    def _remove(self, item_id):
+        item = self.items.pop(item_id, None)
+        if item is None:
+            return
+        score, _, terms = item
+        for term in terms:
+            entry = (term, -score, item_id)
+            position = bisect_left(self.entries, entry)
+            if position < len(self.entries) and self.entries[position] == entry:
+                del self.entries[position]
+        # A short list may come up short after a removal until the next rebuild refills it.
+        for prefix in set().union(*map(self.short_prefixes, terms)):
+            top = self.short.get(prefix)
+            if top and (-score, item_id) in top:
+                top.remove((-score, item_id))
+        self._forget(terms)
+
+    def _forget(self, terms):
+        for term in terms:
+            for end in range(self.short_prefix + 1, len(term) + 1):
+                self.memo.pop(term[:end], None)
+
+    def lookup(self, prefix, limit):
+        with self.lock:
+            if len(prefix) <= self.short_prefix:
+                return [self.items[item_id][1] for _, item_id in self.short.get(prefix, ())[:limit]]
+            results = self.memo.get(prefix)
+            if results is None:
+                results = self.memo[prefix] = self._search(prefix)
+                if len(self.memo) > MEMO_SIZE:
+                    self.memo.popitem(last=False)
+            else:
+                self.memo.move_to_end(prefix)
+        return results[:limit]
+
+    def _search(self, prefix):
+        entries = self.entries
+        matches = {}
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            _, negative_score, item_id = entries[position]
+            matches[item_id] = negative_score
+            position += 1
+        top = heapq.nsmallest(MAX_SUGGESTIONS, ((score, item_id) for item_id, score in matches.items()))
+        return [self.items[item_id][1] for _, item_id in top]
+
+
+class Suggester:
+    # One per process. Signals apply product/category changes in the writing process;
+    # other workers see them after the periodic rebuild.
+    def __init__(self):
+        self.products = self.categories = self.attributes = None
+        self.built_at = 0
+        self.attributes_stale = False
+        self.lock = threading.Lock()
+        # Guards the swap to a new index and the changes made while it was loading.
+        self.changes_lock = threading.Lock()
+        self.changes = None
+
+    @property
+    def built(self):
+        return self.products is not None
+
+    def build(self):
+        # Loads without touching the live index; lookups keep using it until the swap at the end.
+        with self.changes_lock:
+            self.changes = []
+        budget = settings.SUGGEST_MAX_ENTRIES
+        categories = PrefixIndex(budget)
+        categories.load(
+            (category.pk, category.products_count, category.title,
+             {'id': category.pk, 'title': category.title, 'slug': category.slug})
+            for category in categories_with_totals().order_by('-products_count')
+        )
+        attributes = self.load_attributes(budget - len(categories))
+        products = PrefixIndex(budget - len(categories) - len(attributes))
+        products.load(
+            (product_id, popularity, name, {'id': product_id, 'name': name, 'slug': slug})
+            for product_id, popularity, name, slug in Product.objects.order_by('-popularity').values_list(
+                'id', 'popularity', 'name', 'slug'
+            ).iterator(chunk_size=5000)
+        )
+        with self.changes_lock:
+            # Changes committed while loading may be missing from what the queries read.
+            indexes = {'products': products, 'categories': categories}
+            for name, method, args in self.changes:
+                getattr(indexes[name], method)(*args)
+            self.changes = None
+            self.categories, self.attributes, self.products = categories, attributes, products
+            self.attributes_stale = False
+            self.built_at = time.monotonic()
+
+    def load_attributes(self, budget):
+        attributes = PrefixIndex(budget)
+        attributes.load(
+            (value_id, uses, value, value)
+            for value_id, uses, value in AttributeValue.objects.annotate(uses=Count('attribute')).filter(
+                uses__gt=0
+            ).order_by('-uses').values_list('id', 'uses', 'value')[:settings.SUGGEST_ATTRIBUTE_VALUES]
+        )
+        return attributes
+
+    def ensure_built(self):
+        expired = time.monotonic() - self.built_at > settings.SUGGEST_REFRESH_SECONDS
+        if self.built and not expired and not self.attributes_stale:
+            return
+        # One thread refreshes; the others keep answering from the current index instead of
+        # waiting for it. Only the very first build makes callers wait.
+        if not self.lock.acquire(blocking=not self.built):
+            return
+        try:
+            if not self.built or time.monotonic() - self.built_at > settings.SUGGEST_REFRESH_SECONDS:
+                self.build()
+            elif self.attributes_stale:
+                self.attributes_stale = False
+                self.attributes = self.load_attributes(self.attributes.max_entries)
+        finally:
+            self.lock.release()
+
+    def suggest(self, query, limit=10):
+        prefix = normalize(query)[:MAX_LABEL_LENGTH]
+        if not prefix:
+            return {'products': [], 'categories': [], 'attributes': []}
+        self.ensure_built()
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        return {
+            'products': self.products.lookup(prefix, limit),
+            'categories': self.categories.lookup(prefix, limit),
+            'attributes': self.attributes.lookup(prefix, limit),
+        }
+
+    def change(self, name, method, *args):
+        with self.changes_lock:
+            if self.built:
+                getattr(getattr(self, name), method)(*args)
+            if self.changes is not None:
+                self.changes.append((name, method, args))
+
+    def product_changed(self, product):
+        self.change('products', 'put', product.pk, product.popularity, product.name,
+                    {'id': product.pk, 'name': product.name, 'slug': product.slug})
+
+    def product_removed(self, product_id):
+        self.change('products', 'remove', product_id)
+
+    def category_changed(self, category):
+        # Keep the subtree total the index was built with; the next rebuild refreshes it.
+        categories = self.categories
+        score = categories.items.get(category.pk, (category.product_count,))[0] if categories else category.product_count
+        self.change('categories', 'put', category.pk, score, category.title,
+                    {'id': category.pk, 'title': category.title, 'slug': category.slug})
+
+    def category_removed(self, category_id):
+        self.change('categories', 'remove', category_id)
+
+    def attributes_changed(self):
+        self.attributes_stale = True
+
+    def expire(self):
+        # Cheaper than removing thousands of items one by one: the next lookup rebuilds.
+        self.built_at = -settings.SUGGEST_REFRESH_SECONDS
+
+
+suggester = Suggester()
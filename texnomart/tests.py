@@ -1,3 +1,1049 @@
-from django.test import TestCase
+import importlib
+import os
+import tempfile
+import threading
+import json
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from texnomart.authentication import load_user_values, forget_user, local_users, user_cache_key, user_generation, \
+    user_generation_key, USER_CACHE_VERSION, USER_FIELDS
+from texnomart.caching import PRODUCT_LIST_CACHE_KEYS, category_products_cache_keys, product_detail_cache_key
+from texnomart.campaigns import run_due_campaigns
+from texnomart import deletion
+from texnomart.deletion import delete_categories, purge_media
+from texnomart.management.commands.bench_sqlite_readers import connect
+from texnomart import metrics, recommendations
+from texnomart.models import Category, CategoryClosure, Product, ProductRecommendation, RecommendationUpdate, \
+    Campaign, CampaignProduct, PendingMediaDeletion, Comment, RevokedToken, Attribute, AttributeKey, AttributeValue
+from texnomart.paginators import ApproximateCountPaginator, estimated_row_count
+from texnomart.popularity import comment_weight, daily_decay_factor, decay as decay_popularity, \
+    rebuild as rebuild_popularity, HALF_LIFE_DAYS, LIKE_WEIGHT
+from texnomart.querycheck import assert_no_n_plus_one, inspect_queries, sql_shape
+from texnomart.revocation import prune_revoked_tokens, revoke
+from texnomart.serializers import AttributeKeySerializer, AttributeValueSerializer
+from texnomart.storage import ContentAddressedStorage
+from texnomart.suggest import suggester
+from texnomart.throttling import THROTTLE_CACHE, LoginThrottle, SearchThrottle, WriteThrottle, check_throttle_cache
+
+# The real settings keep the default cache in files under BASE_DIR/cache; tests must never write to or
+# clear those, so every test class runs against process-local caches under the same aliases.
+TEST_CACHES = {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+               for alias in settings.CACHES}
+isolated_caches = override_settings(CACHES=TEST_CACHES)
+
+
+def seed(**options):
+    call_command('seed_catalog', **{'products': 60, 'categories': 20, 'users': 5, 'verbosity': 0,
+                                    'stdout': StringIO(), **options})
+
+
+@isolated_caches
+class SeedCatalogTests(TestCase):
+    def test_flush_removes_dependents_and_seeds_again(self):
+        seed()
+        products = list(Product.objects.order_by('pk')[:2])
+        ProductRecommendation.objects.create(product=products[0], recommended=products[1], score=1)
+        RecommendationUpdate.objects.create(product=products[0])
+        PendingMediaDeletion.objects.create(name='images/gone.jpg')
+        campaign = Campaign.objects.create(name='Sale', discount=10, starts_at=timezone.now(),
+                                           ends_at=timezone.now() + timedelta(hours=1),
+                                           category=products[0].category)
+        campaign.products.add(products[1])
+        CampaignProduct.objects.create(campaign=campaign, product=products[0], previous_discount=0)
+
+        seed(flush=True)
+
+        self.assertEqual(Product.objects.count(), 60)
+        self.assertEqual(Category.objects.count(), 20)
+        self.assertFalse(ProductRecommendation.objects.exists())
+        self.assertFalse(CampaignProduct.objects.exists())
+        self.assertEqual(CategoryClosure.objects.filter(depth=0).count(), 20)
+
+
+@isolated_caches
+@override_settings(THROTTLE_ENABLED=True)
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches[THROTTLE_CACHE].clear()
+        User.objects.create_user(username='victim', password='correct-horse')
+
+    def login(self, password, ip):
+        return self.client.post('/api-token-auth/', {'username': 'victim', 'password': password}, REMOTE_ADDR=ip)
+
+    def test_failures_from_many_ips_lock_the_username(self):
+        for attempt in range(10):
+            self.assertEqual(self.login('wrong', f'10.0.0.{attempt}').status_code, 400)
+        self.assertEqual(self.login('wrong', '10.0.1.1').status_code, 429)
+        self.assertEqual(self.login('correct-horse', '10.0.1.2').status_code, 429)
+
+    def test_rejected_requests_do_not_extend_the_lock(self):
+        for attempt in range(10):
+            self.login('wrong', f'10.0.0.{attempt}')
+        for attempt in range(20):
+            self.assertEqual(self.login('wrong', f'10.0.2.{attempt}').status_code, 429)
+        throttle = LoginThrottle()
+        ident, window = throttle.username_ident('victim'), throttle.current_window()[0]
+        counts = caches[THROTTLE_CACHE].get_many([throttle.counter_key(ident, window - 1),
+                                                  throttle.counter_key(ident, window)])
+        self.assertEqual(sum(counts.values()), 10)
+
+    def test_successful_login_clears_the_failures(self):
+        for attempt in range(9):
+            self.login('wrong', f'10.0.0.{attempt}')
+        self.assertEqual(self.login('correct-horse', '10.0.1.1').status_code, 200)
+        for attempt in range(9):
+            self.assertEqual(self.login('wrong', f'10.0.3.{attempt}').status_code, 400)
+        self.assertEqual(self.login('correct-horse', '10.0.1.2').status_code, 200)
+
+    def test_attempts_with_a_username_still_count_against_the_ip(self):
+        for attempt in range(10):
+            self.client.post('/api-token-auth/', {'username': f'user{attempt}', 'password': 'x'},
+                             REMOTE_ADDR='10.0.4.1')
+        self.assertEqual(self.login('correct-horse', '10.0.4.1').status_code, 429)
+        self.assertEqual(self.login('correct-horse', '10.0.4.2').status_code, 200)
+
+    def test_spoofed_forwarded_for_does_not_reset_the_ip_budget(self):
+        for attempt in range(10):
+            self.client.post('/api-token-auth/', {'username': f'user{attempt}', 'password': 'x'},
+                             REMOTE_ADDR='10.0.5.1', HTTP_X_FORWARDED_FOR=f'192.0.2.{attempt}')
+        response = self.client.post('/api-token-auth/', {'username': 'victim', 'password': 'correct-horse'},
+                                    REMOTE_ADDR='10.0.5.1', HTTP_X_FORWARDED_FOR='192.0.2.200')
+        self.assertEqual(response.status_code, 429)
+
+    def test_process_local_counters_are_refused_with_several_workers(self):
+        locmem = {THROTTLE_CACHE: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem, WEB_WORKERS=4):
+            self.assertEqual([error.id for error in check_throttle_cache(None)], ['texnomart.E001'])
+        with override_settings(CACHES=locmem, WEB_WORKERS=1):
+            self.assertEqual(check_throttle_cache(None), [])
+
+
+@isolated_caches
+@override_settings(THROTTLE_ENABLED=True)
+@mock.patch.object(SearchThrottle, 'rate', '2/min', create=True)
+class AsyncSearchThrottleTests(TestCase):
+    def setUp(self):
+        caches[THROTTLE_CACHE].clear()
+        self.category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.access = RefreshToken.for_user(User.objects.create_user(username='shopper')).access_token
+
+    def test_async_search_spends_the_search_budget(self):
+        for path, headers in (('/texnomart-uz/async/', {'HTTP_AUTHORIZATION': f'Bearer {self.access}'}),
+                              (f'/texnomart-uz/async/category/{self.category.slug}/', {})):
+            caches[THROTTLE_CACHE].clear()
+            statuses = [self.client.get(path, {'search': 'phone'}, **headers).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            self.assertEqual(self.client.get(path, **headers).status_code, 200)
+
+
+@isolated_caches
+class CampaignTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.parent = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.child = Category.objects.create(title='Smartphones', image='images/smart.jpg', parent=self.parent)
+        self.other = Category.objects.create(title='TV', image='images/tv.jpg')
+        self.phone = Product.objects.create(name='Phone', price=100, description='', category=self.child, discount=5)
+        self.tv = Product.objects.create(name='TV', price=300, description='', category=self.other)
+
+    def campaign(self, discount, category=None, starts=0, ends=2):
+        return Campaign.objects.create(name=f'{discount}% off', discount=discount, category=category,
+                                       starts_at=self.now + timedelta(hours=starts),
+                                       ends_at=self.now + timedelta(hours=ends))
+
+    def run_at(self, hours):
+        run_due_campaigns(now=self.now + timedelta(hours=hours))
+
+    def discounts(self):
+        return dict(Product.objects.values_list('name', 'discount'))
+
+    def test_start_applies_to_the_category_subtree_and_end_restores(self):
+        campaign = self.campaign(20, category=self.parent)
+        self.run_at(0)
+        self.assertEqual(self.discounts(), {'Phone': 20, 'TV': 0})
+        self.run_at(2)
+        self.assertEqual(self.discounts(), {'Phone': 5, 'TV': 0})
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, Campaign.Status.FINISHED)
+        self.assertFalse(CampaignProduct.objects.exists())
+
+    def test_overlapping_campaign_leaves_running_products_alone(self):
+        self.campaign(20, category=self.parent)
+        self.run_at(0)
+        self.campaign(30, starts=1, ends=3)
+        self.run_at(1)
+        self.assertEqual(self.discounts(), {'Phone': 20, 'TV': 30})
+        self.run_at(2)
+        self.assertEqual(self.discounts(), {'Phone': 5, 'TV': 30})
+        self.run_at(3)
+        self.assertEqual(self.discounts(), {'Phone': 5, 'TV': 0})
+
+    def test_discount_edited_during_the_campaign_is_kept(self):
+        self.campaign(20)
+        self.run_at(0)
+        Product.objects.filter(pk=self.phone.pk).update(discount=50)
+        self.run_at(2)
+        self.assertEqual(self.discounts(), {'Phone': 50, 'TV': 0})
+
+    def test_deleting_an_active_campaign_restores_discounts(self):
+        self.campaign(20).delete()
+        self.assertEqual(self.discounts(), {'Phone': 5, 'TV': 0})
+        self.campaign(20)
+        self.run_at(0)
+        Campaign.objects.all().delete()
+        self.assertEqual(self.discounts(), {'Phone': 5, 'TV': 0})
+
+    def test_clean_reports_a_missing_discount_as_a_field_error(self):
+        campaign = Campaign(name='Sale', starts_at=self.now, ends_at=self.now + timedelta(hours=1))
+        with self.assertRaises(ValidationError) as error:
+            campaign.full_clean()
+        self.assertIn('discount', error.exception.message_dict)
+
+
+@isolated_caches
+class SQLiteConcurrencyTests(SimpleTestCase):
+    # The test database lives in memory, so this runs the production pragmas on a file. Latency
+    # under load is measured by bench_sqlite_readers; this only checks that readers never wait.
+    def test_readers_do_not_wait_for_an_open_write_transaction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.sqlite3')
+            writer = connect(path, settings.SQLITE_PRAGMAS)
+            self.assertEqual(writer.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            writer.execute('CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, category_id INTEGER)')
+            writer.executemany('INSERT INTO product (name, category_id) VALUES (?, ?)',
+                               ((f'product {i}', i % 50) for i in range(1000)))
+            # A tiny page cache makes the writer spill dirty pages before it commits, which with a
+            # rollback journal takes the exclusive lock that shuts readers out.
+            writer.execute('PRAGMA cache_size=10')
+            writer.execute('BEGIN IMMEDIATE')
+            writer.executemany('INSERT INTO product (name, category_id) VALUES (?, ?)',
+                               ((f'bulk {i}', i % 50) for i in range(5000)))
+            writer.execute('UPDATE product SET category_id = category_id + 1')
+
+            reader = connect(path, settings.SQLITE_PRAGMAS)
+            # Fail at once with 'database is locked' instead of waiting for the writer.
+            reader.execute('PRAGMA busy_timeout=0')
+            count = 'SELECT COUNT(*) FROM product WHERE category_id = 1'
+            # Readers keep seeing the last committed state until the writer commits.
+            self.assertEqual(reader.execute(count).fetchone()[0], 20)
+            writer.execute('COMMIT')
+            self.assertEqual(reader.execute(count).fetchone()[0], 120)
+            reader.close()
+            writer.close()
+
+
+@isolated_caches
+class QueryCheckTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+        category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        for i in range(6):
+            product = Product.objects.create(name=f'Phone {i}', price=100, description='', category=category)
+            Comment.objects.create(product=product, user=cls.admin, rating=5, content='Good')
+        cls.product = product
+
+    def test_sql_shape_ignores_literals_and_in_list_length(self):
+        self.assertEqual(sql_shape("SELECT * FROM t WHERE id = 1 AND name = 'a''b'"),
+                         sql_shape("SELECT * FROM t WHERE id = 22 AND name = 'c'"))
+        self.assertEqual(sql_shape('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+                         sql_shape('SELECT * FROM t WHERE id IN (%s)'))
+        self.assertNotEqual(sql_shape('SELECT * FROM t WHERE id = 1'), sql_shape('SELECT * FROM u WHERE id = 1'))
+
+    def test_repeats_below_the_threshold_are_not_reported(self):
+        with inspect_queries(threshold=7, slow_ms=0) as report:
+            for comment in Comment.objects.all():
+                str(comment)
+        self.assertEqual(report.repeated, [])
+        with inspect_queries(threshold=6, slow_ms=0) as report:
+            for comment in Comment.objects.all():
+                str(comment)
+        # One user and one product lookup per comment.
+        self.assertEqual([shape.count for shape in report.repeated], [6, 6])
+
+    def test_report_names_the_frame_that_ran_the_query(self):
+        with self.assertRaises(AssertionError) as error:
+            with assert_no_n_plus_one():
+                for comment in Comment.objects.all():
+                    str(comment)
+        self.assertIn('6x', str(error.exception))
+        self.assertIn('texnomart/models.py', str(error.exception))
+        self.assertIn('in __str__', str(error.exception))
+
+    @assert_no_n_plus_one
+    def test_delete_product_view_get(self):
+        response = self.client.get(f'/texnomart-uz/product/{self.product.pk}/delete/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_admin_changelist(self):
+        self.client.force_login(self.admin)
+        with assert_no_n_plus_one():
+            response = self.client.get('/admin/texnomart/comment/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Phone 5')
+
+
+@isolated_caches
+class RevocationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper', password='secret')
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': str(token)})
+
+    def test_logout_revokes_the_refresh_token(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.client.post('/texnomart-uz/logout/', {'refresh': str(token)},
+                         HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(RefreshToken.for_user(self.user)).status_code, 200)
+
+    def test_prune_removes_only_expired_revocations(self):
+        now = timezone.now()
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f'old{i}', expires_at=now - timedelta(minutes=1)) for i in range(3)]
+            + [RevokedToken(jti='live', expires_at=now + timedelta(days=1))]
+        )
+        self.assertEqual(prune_revoked_tokens(batch_size=2), 3)
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+
+    @override_settings(REVOKED_TOKEN_PRUNE_EVERY=1, REVOKED_TOKEN_PRUNE_BATCH=2)
+    def test_revoking_prunes_a_batch_of_expired_revocations(self):
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f'old{i}', expires_at=timezone.now() - timedelta(minutes=1)) for i in range(3)]
+        )
+        token = RefreshToken.for_user(self.user)
+        revoke(token)
+        self.assertEqual(RevokedToken.objects.filter(jti__startswith='old').count(), 1)
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti']).exists())
+
+
+@isolated_caches
+class UserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username='shopper', password='secret')
+
+    def is_active(self):
+        return load_user_values(self.user.pk)[USER_FIELDS.index('is_active')]
+
+    def test_a_load_racing_a_deactivation_is_not_served_afterwards(self):
+        def deactivate_after_read(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if 'auth_user' in sql and sql.lstrip().upper().startswith('SELECT'):
+                # The read above already saw is_active=True.
+                User.objects.filter(pk=self.user.pk).update(is_active=False)
+                forget_user(self.user.pk)
+            return result
+
+        with connection.execute_wrapper(deactivate_after_read):
+            self.assertTrue(self.is_active())
+        self.assertFalse(self.is_active())
+
+    def test_a_load_between_the_save_and_the_commit_is_not_served_afterwards(self):
+        self.assertTrue(self.is_active())
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.is_active = False
+                self.user.save()
+                # Another worker still sees the committed row and caches it under the new generation.
+                stale = list(User.objects.filter(pk=self.user.pk).values_list(*USER_FIELDS).first())
+                stale[USER_FIELDS.index('is_active')] = True
+                cache.set(user_cache_key(self.user.pk, user_generation(self.user.pk)), tuple(stale),
+                          version=USER_CACHE_VERSION)
+        self.assertFalse(self.is_active())
+
+    def test_a_culled_generation_does_not_bring_back_old_entries(self):
+        generation_key = user_generation_key(self.user.pk)
+        cache.delete(generation_key, version=USER_CACHE_VERSION)
+        self.assertTrue(self.is_active())
+        # Deactivated without the signal, then the generation is culled from the cache.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        local_users.clear()
+        cache.delete(generation_key, version=USER_CACHE_VERSION)
+        self.assertFalse(self.is_active())
+
+    def test_saving_a_user_drops_the_cached_values(self):
+        self.assertTrue(self.is_active())
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.is_active())
+
+    def test_a_deactivated_user_is_refused_on_the_token_user_read_path(self):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        for url in ('/texnomart-uz/', '/texnomart-uz/categories/', '/texnomart-uz/async/'):
+            self.assertEqual(self.client.get(url, **headers).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        for url in ('/texnomart-uz/', '/texnomart-uz/categories/', '/texnomart-uz/async/'):
+            self.assertEqual(self.client.get(url, **headers).status_code, 401)
+
+
+@isolated_caches
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def test_duplicate_upload_refreshes_the_shared_file(self):
+        name = self.storage.save('images/photo.jpg', ContentFile(b'pixels'))
+        os.utime(self.storage.path(name), (0, 0))
+        self.assertEqual(self.storage.save('images/copy.jpg', ContentFile(b'pixels')), name)
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), time.time() - 60)
+
+    def test_purge_media_leaves_recently_touched_files_queued(self):
+        with override_settings(MEDIA_ROOT=self.storage.location):
+            old = default_storage.save('images/old.jpg', ContentFile(b'old'))
+            fresh = default_storage.save('images/fresh.jpg', ContentFile(b'fresh'))
+            os.utime(default_storage.path(old), (0, 0))
+            PendingMediaDeletion.objects.bulk_create([PendingMediaDeletion(name=name) for name in (old, fresh)])
+            self.assertEqual(purge_media(batch_size=1), (1, 0, 1))
+            self.assertFalse(default_storage.exists(old))
+            self.assertTrue(default_storage.exists(fresh))
+            self.assertEqual(list(PendingMediaDeletion.objects.values_list('name', flat=True)), [fresh])
+
+
+@isolated_caches
+class ProductListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shopper', password='secret')
+        self.phones = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.smartphones = Category.objects.create(title='Smartphones', image='images/smart.jpg', parent=self.phones)
+        self.tv = Category.objects.create(title='TV', image='images/tv.jpg')
+        self.phone = Product.objects.create(name='Phone', price=100, description='', category=self.smartphones)
+        self.phone.user_likes.add(self.user)
+        self.access = RefreshToken.for_user(self.user).access_token
+
+    def keys(self):
+        keys = list(PRODUCT_LIST_CACHE_KEYS)
+        for category in (self.phones, self.smartphones, self.tv):
+            keys += category_products_cache_keys(category.slug)
+        return keys
+
+    def test_saving_a_product_drops_the_lists_that_show_it(self):
+        cache.set_many({key: [] for key in self.keys()})
+        self.phone.category = self.tv
+        with self.captureOnCommitCallbacks(execute=True):
+            self.phone.save()
+        self.assertEqual(cache.get_many(self.keys()), {})
+
+    def test_async_list_marks_liked_products(self):
+        other = Product.objects.create(name='Other', price=50, description='', category=self.tv)
+        response = self.client.get('/texnomart-uz/async/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        liked = {item['id']: item['user_likes'] for item in response.json()}
+        self.assertEqual(liked, {self.phone.pk: True, other.pk: False})
+
+    def test_a_bad_token_gets_the_same_error_body_as_the_sync_views(self):
+        headers = {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}
+        sync = self.client.get('/texnomart-uz/', **headers)
+        response = self.client.get('/texnomart-uz/async/', **headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    @override_settings(ALLOWED_HOSTS=['first.example', 'second.example'])
+    def test_cached_async_payloads_build_image_urls_per_request(self):
+        self.phone.images.create(image='images/phone.jpg', is_primary=True)
+        paths = ['/texnomart-uz/async/', '/texnomart-uz/async/categories/',
+                 f'/texnomart-uz/async/category/{self.phones.slug}/']
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {self.access}'}
+        for path in paths:
+            self.client.get(path, HTTP_HOST='first.example', **headers)
+        products = self.client.get(paths[0], HTTP_HOST='second.example', secure=True, **headers).json()
+        categories = self.client.get(paths[1], HTTP_HOST='second.example', secure=True).json()
+        category_products = self.client.get(paths[2], HTTP_HOST='second.example', secure=True).json()
+        phones = next(node for node in categories if node['id'] == self.phones.pk)
+        self.assertEqual(
+            [products[0]['image'], phones['image'], phones['children'][0]['image_of_category'],
+             category_products[0]['image']],
+            ['https://second.example/media/images/phone.jpg', 'https://second.example/media/images/phones.jpg',
+             'https://second.example/media/images/smart.jpg', 'https://second.example/media/images/phone.jpg'],
+        )
+
+
+@isolated_caches
+class SuggestTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        suggester.build()
+        self.addCleanup(suggester.expire)
+
+    def names(self, query):
+        return [item['name'] for item in suggester.suggest(query)['products']]
+
+    def test_rolled_back_save_leaves_no_suggestion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Product.objects.create(name='Zyphone', price=1, description='', category=self.category)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.names('zyph'), [])
+
+    def test_committed_save_and_delete_update_suggestions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Zyphone', price=1, description='', category=self.category)
+        self.assertEqual(self.names('zyph'), ['Zyphone'])
+        # product_pre_delete archives every deleted product.
+        self.addCleanup(os.remove, f'texnomart/deleted/Zyphone_id_{product.pk}.json')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.names('zyph'), [])
+
+    def test_lookups_use_the_current_index_while_another_thread_rebuilds(self):
+        Product.objects.create(name='Zyphone', price=1, description='', category=self.category)
+        suggester.build()
+        suggester.expire()
+        results = []
+        with suggester.lock:
+            lookup = threading.Thread(target=lambda: results.append(self.names('zyph')))
+            lookup.start()
+            lookup.join(timeout=5)
+        self.assertEqual(results, [['Zyphone']])
+
+    def test_changes_made_during_a_rebuild_reach_the_new_index(self):
+        load_attributes = suggester.load_attributes
+
+        def rename_while_loading(budget):
+            self.category.title = 'Smartphones'
+            suggester.category_changed(self.category)
+            return load_attributes(budget)
+
+        with mock.patch.object(suggester, 'load_attributes', rename_while_loading):
+            suggester.build()
+        self.assertEqual([item['title'] for item in suggester.suggest('smart')['categories']], ['Smartphones'])
+
+
+@isolated_caches
+class DeleteCategoriesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = mock.patch('texnomart.deletion.ARCHIVE_DIRECTORY', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name)) as archive:
+            return archive.read()
+
+    def test_archives_keep_the_per_row_format_and_details_are_dropped(self):
+        phones = Category.objects.create(title='Phones', image='images/phones.jpg')
+        empty = Category.objects.create(title='Empty', image='images/empty.jpg', parent=phones)
+        products = [Product.objects.create(name=f'Phone {i}', price=100, description='', category=phones)
+                    for i in range(3)]
+        cache.set_many({product_detail_cache_key(product.pk): {} for product in products})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = delete_categories([phones.pk])
+
+        self.assertEqual((result['categories'], result['products']), (2, 3))
+        self.assertEqual(self.read(f'Phones_id_{phones.pk}.json'), json.dumps(
+            {'id': phones.pk, 'title': 'Phones', 'products': ['Phone 0', 'Phone 1', 'Phone 2'], 'slug': 'phones'},
+            indent=4))
+        self.assertEqual(self.read(f'Empty_id_{empty.pk}.json'), json.dumps(
+            {'id': empty.pk, 'title': 'Empty', 'products': [], 'slug': 'empty'}, indent=4))
+        archived = json.loads(self.read(f'Phone 0_id_{products[0].pk}.json'))
+        self.assertEqual((archived['name'], archived['category']), ('Phone 0', 'Phones'))
+        self.assertEqual(cache.get_many([product_detail_cache_key(product.pk) for product in products]), {})
+        self.assertFalse(Product.objects.exists())
+
+    def test_open_spools_do_not_grow_with_the_subtree(self):
+        parent = None
+        for i in range(5):
+            parent = Category.objects.create(title=f'Level {i}', image='images/level.jpg', parent=parent)
+            Product.objects.create(name=f'Item {i}', price=1, description='', category=parent)
+        opened = []
+        original_temporary_file = tempfile.TemporaryFile
+
+        def temporary_file(*args, **kwargs):
+            opened.append(original_temporary_file(*args, **kwargs))
+            return opened[-1]
+
+        root = Category.objects.get(title='Level 0')
+        with mock.patch('texnomart.deletion.tempfile.TemporaryFile', temporary_file), \
+                self.captureOnCommitCallbacks(execute=True):
+            delete_categories([root.pk])
+        self.assertEqual(len(opened), 3)
+        self.assertTrue(all(file.closed for file in opened))
+        self.assertEqual(json.loads(self.read(f'Level 3_id_{parent.pk - 1}.json'))['products'], ['Item 3'])
+        self.assertEqual(json.loads(self.read(f'Level 4_id_{parent.pk}.json'))['products'], ['Item 4'])
+
+    def test_rolled_back_deletion_writes_no_archives(self):
+        phones = Category.objects.create(title='Phones', image='images/phones.jpg')
+        Product.objects.create(name='Phone', price=100, description='', category=phones)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    delete_categories([phones.pk])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertTrue(Product.objects.exists())
+
+    def test_failed_deletion_closes_its_temporary_files(self):
+        phones = Category.objects.create(title='Phones', image='images/phones.jpg')
+        Product.objects.create(name='Phone', price=100, description='', category=phones)
+        opened = []
+        original_temporary_file = tempfile.TemporaryFile
+
+        def temporary_file(*args, **kwargs):
+            opened.append(original_temporary_file(*args, **kwargs))
+            return opened[-1]
+
+        def cascade_delete(model, ids):
+            if model is Category:
+                raise RuntimeError
+            original_cascade_delete(model, ids)
+
+        original_cascade_delete = deletion.cascade_delete
+        with mock.patch('texnomart.deletion.tempfile.TemporaryFile', temporary_file), \
+                mock.patch('texnomart.deletion.cascade_delete', cascade_delete):
+            with self.assertRaises(RuntimeError):
+                delete_categories([phones.pk])
+        self.assertEqual(len(opened), 3)
+        self.assertTrue(all(file.closed for file in opened))
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@isolated_caches
+class RecommendationQueueTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.a, self.b, self.c = [Product.objects.create(name=name, price=1, description='', category=category)
+                                  for name in 'ABC']
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(3)]
+        self.a.user_likes.add(self.users[0])
+        self.b.user_likes.add(self.users[0], self.users[1])
+        self.c.user_likes.add(self.users[1])
+        call_command('compute_recommendations', '--full', stdout=StringIO())
+        RecommendationUpdate.objects.all().delete()
+
+    def queued(self):
+        return set(RecommendationUpdate.objects.values_list('product__name', flat=True))
+
+    def test_a_like_requeues_the_neighbours_sharing_other_users(self):
+        self.a.user_likes.add(self.users[2])
+        self.assertEqual(self.queued(), {'A'})
+        call_command('compute_recommendations', stdout=StringIO())
+        self.assertEqual(self.queued(), set())
+        # B's score for A uses A's new total of 2: 1 / sqrt(2 * 2).
+        self.assertAlmostEqual(ProductRecommendation.objects.get(product=self.b, recommended=self.a).score, 0.5)
+
+    def test_a_like_arriving_during_a_rebuild_stays_queued(self):
+        self.a.user_likes.add(self.users[2])
+        top_neighbours = recommendations.top_neighbours
+
+        def like_while_reading(*args, **kwargs):
+            rows = top_neighbours(*args, **kwargs)
+            self.c.user_likes.add(self.users[2])
+            return rows
+
+        with mock.patch.object(recommendations, 'top_neighbours', side_effect=like_while_reading):
+            call_command('compute_recommendations', stdout=StringIO())
+        self.assertTrue({'A', 'C'} <= self.queued())
+        call_command('compute_recommendations', stdout=StringIO())
+        self.assertEqual(self.queued(), set())
+        self.assertTrue(ProductRecommendation.objects.filter(product=self.c, recommended=self.a).exists())
+
+    def test_a_rating_dropping_below_positive_is_queued(self):
+        comment = Comment.objects.create(product=self.c, user=self.users[0], rating=5, content='Good')
+        RecommendationUpdate.objects.all().delete()
+        comment.rating = 2
+        comment.save()
+        self.assertIn('C', self.queued())
+
+
+@isolated_caches
+class WarmCacheTests(TransactionTestCase):
+    # The command reads through its own pool threads, which only see committed rows.
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.products = [Product.objects.create(name=f'Phone {i}', price=100, description='', category=self.phones)
+                         for i in range(3)]
+
+    def warm(self):
+        out = StringIO()
+        call_command('warm_cache', '--host', 'testserver', stdout=out)
+        return out.getvalue()
+
+    def test_fills_the_catalog_keys_and_second_run_finds_them_warm(self):
+        keys = [*PRODUCT_LIST_CACHE_KEYS, *category_products_cache_keys(self.phones.slug),
+                *(product_detail_cache_key(product.pk) for product in self.products)]
+        self.assertIn(f'Warmed {len(keys)} cache keys', self.warm())
+        self.assertEqual(set(cache.get_many(keys)), set(keys))
+        second_run = self.warm()
+        self.assertIn('Warmed 0 cache keys', second_run)
+        self.assertIn(f'({len(keys)} already warm, 0 failed, 0 skipped', second_run)
+
+    def test_warms_only_what_the_cache_can_hold(self):
+        # Half of 16 entries: the four lists, the category's two pages and two of the three details.
+        small = dict(TEST_CACHES, default={'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                           'LOCATION': 'test-small', 'OPTIONS': {'MAX_ENTRIES': 16}})
+        with override_settings(CACHES=small):
+            output = self.warm()
+            self.assertIn('Warmed 8 cache keys', output)
+            self.assertIn('1 left out to fit the cache', output)
+            details = [product_detail_cache_key(product.pk) for product in self.products]
+            self.assertEqual(len(cache.get_many(details)), 2)
+
+    @override_settings(ALLOWED_HOSTS=[])
+    def test_refuses_to_guess_a_host(self):
+        with self.assertRaises(CommandError):
+            call_command('warm_cache', stdout=StringIO())
+        self.assertEqual(cache.get_many(PRODUCT_LIST_CACHE_KEYS), {})
+
+
+@isolated_caches
+class DenormalizedFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper')
+        self.category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.product = Product.objects.create(name='Phone', price=100, description='', category=self.category)
+        self.stale_product = Product.objects.get(pk=self.product.pk)
+        self.stale_category = Category.objects.get(pk=self.category.pk)
+
+    def test_saving_a_stale_product_keeps_popularity(self):
+        self.product.user_likes.add(self.user)
+        self.stale_product.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).popularity, 1.0)
+
+    def test_saving_a_stale_product_keeps_attributes_data(self):
+        Attribute.objects.create(product=self.product, key=AttributeKey.objects.create(key='Color'),
+                                 value=AttributeValue.objects.create(value='Black'))
+        self.stale_product.name = 'Renamed'
+        self.stale_product.save()
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.name, product.attributes_data), ('Renamed', {'Color': 'Black'}))
+
+    def test_saving_a_stale_category_keeps_product_totals(self):
+        Product.objects.create(name='Phone 2', price=50, description='', category=self.category)
+        self.stale_category.save()
+        category = Category.objects.get(pk=self.category.pk)
+        self.assertEqual((category.product_count, category.product_price_sum), (2, 150.0))
+
+    def test_category_list_exposes_only_the_subtree_totals(self):
+        child = Category.objects.create(title='Smartphones', image='images/smart.jpg', parent=self.category)
+        Product.objects.create(name='Phone 2', price=50, description='', category=child)
+        phones = self.client.get('/texnomart-uz/categories/').json()[0]
+        self.assertNotIn('product_price_sum', phones)
+        self.assertEqual((phones['product_count'], phones['total_price_of_products']), (2, 150))
+
+
+@isolated_caches
+class PopularityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper')
+        self.category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.product = Product.objects.create(name='Phone', price=100, description='', category=self.category)
+
+    def popularity(self):
+        return Product.objects.get(pk=self.product.pk).popularity
+
+    def week_old_comment(self, rating):
+        comment = Comment.objects.create(product=self.product, user=self.user, rating=rating, content='Good')
+        Comment.objects.filter(pk=comment.pk).update(created_at=timezone.now() - timedelta(days=HALF_LIFE_DAYS))
+        rebuild_popularity()
+        return Comment.objects.get(pk=comment.pk)
+
+    def test_editing_an_old_comment_swaps_its_decayed_weight(self):
+        comment = self.week_old_comment(5)
+        self.assertAlmostEqual(self.popularity(), comment_weight(5) / 2, places=4)
+        comment.rating = 4
+        comment.save()
+        self.assertAlmostEqual(self.popularity(), comment_weight(4) / 2, places=4)
+
+    def test_deleting_an_old_comment_removes_only_what_is_left_of_it(self):
+        self.week_old_comment(5).delete()
+        self.assertAlmostEqual(self.popularity(), 0, places=4)
+
+    def test_decay_keeps_likes_at_full_weight_like_rebuild(self):
+        self.product.user_likes.add(self.user)
+        Comment.objects.create(product=self.product, user=self.user, rating=5, content='Good')
+        decay_popularity(daily_decay_factor())
+        decayed = self.popularity()
+        Comment.objects.update(created_at=timezone.now() - timedelta(days=1))
+        rebuild_popularity()
+        self.assertAlmostEqual(decayed, LIKE_WEIGHT + comment_weight(5) * daily_decay_factor(), places=4)
+        self.assertAlmostEqual(self.popularity(), decayed, places=4)
+
+    def test_migration_backfills_existing_scores(self):
+        self.product.user_likes.add(self.user)
+        Comment.objects.create(product=self.product, user=self.user, rating=5, content='Good')
+        Product.objects.update(popularity=0)
+        migration = importlib.import_module('texnomart.migrations.0004_product_popularity')
+        migration.fill_popularity(django_apps, None)
+        self.assertAlmostEqual(self.popularity(), LIKE_WEIGHT + comment_weight(5), places=4)
+
+
+@isolated_caches
+class ApproximateCountTests(TestCase):
+    def setUp(self):
+        seed()
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+
+    def test_large_changelist_runs_no_count_query(self):
+        with mock.patch.object(ApproximateCountPaginator, 'approximate_above', 10), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/texnomart/product/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, Product.objects.order_by('-pk').first().pk)
+        self.assertEqual([query['sql'] for query in queries if 'COUNT(' in query['sql']], [])
+
+    def test_estimate_prefers_analyze_statistics(self):
+        # A gap in the primary keys makes MAX(rowid) overshoot; the ANALYZE figure does not.
+        Product.objects.create(pk=100_000, name='Gap', price=1, description='', category=Category.objects.first())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_row_count(Product), Product.objects.count())
+
+
+@isolated_caches
+class AttributeNormalizationTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(title='Phones', image='images/phones.jpg')
+        self.product = Product.objects.create(name='Phone', price=100, description='', category=self.category)
+
+    def test_admin_rejects_a_key_differing_only_in_whitespace(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='x'))
+        AttributeKey.objects.create(key='Screen size')
+        response = self.client.post('/admin/texnomart/attributekey/add/', {'key': ' Screen   size '})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AttributeKey.objects.count(), 1)
+        self.client.post('/admin/texnomart/attributekey/add/', {'key': ' Battery\tlife '})
+        self.assertTrue(AttributeKey.objects.filter(key='Battery life').exists())
+
+    def test_serializers_store_normalized_text(self):
+        AttributeValue.objects.create(value='Black')
+        self.assertFalse(AttributeValueSerializer(data={'value': '  Black '}).is_valid())
+        serializer = AttributeKeySerializer(data={'key': 'Screen \n size'})
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.save().key, 'Screen size')
+
+    def test_migration_merges_duplicates_and_fills_attributes_data(self):
+        migration = importlib.import_module('texnomart.migrations.0006_merge_attribute_duplicates')
+        keys = [AttributeKey.objects.create(key=key) for key in ('Color', ' Color', 'Color  ')]
+        value = AttributeValue.objects.create(value='Black ')
+        for key in keys:
+            Attribute.objects.create(product=self.product, key=key, value=value)
+        Product.objects.update(attributes_data={})
+        migration.merge_attribute_dictionary(django_apps, None)
+        migration.fill_attributes_data(django_apps, None)
+        self.assertEqual(list(AttributeKey.objects.values_list('pk', 'key')), [(keys[0].pk, 'Color')])
+        self.assertEqual(list(AttributeValue.objects.values_list('value', flat=True)), ['Black'])
+        self.assertEqual(set(Attribute.objects.values_list('key_id', flat=True)), {keys[0].pk})
+        self.assertEqual(Product.objects.get(pk=self.product.pk).attributes_data, {'Color': 'Black'})
+
+
+@isolated_caches
+class ServeMediaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        os.makedirs(os.path.join(directory.name, 'docs'))
+        with open(os.path.join(directory.name, 'docs', 'digits.txt'), 'wb') as file:
+            file.write(b'0123456789')
+        settings_override = override_settings(MEDIA_ROOT=directory.name, MEDIA_ACCEL_REDIRECT_PREFIX='',
+                                              MEDIA_SENDFILE_HEADER='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.full_path = os.path.join(directory.name, 'docs', 'digits.txt')
+
+    def get(self, **headers):
+        return self.client.get('/media/docs/digits.txt', **headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual((response.status_code, self.body(response)), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_single_and_suffix_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=2-4')
+        self.assertEqual((response.status_code, self.body(response)), (206, b'234'))
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 2-4/10', '3'))
+        response = self.get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((response.status_code, self.body(response)), (206, b'789'))
+        response = self.get(HTTP_RANGE='bytes=7-')
+        self.assertEqual((response['Content-Range'], self.body(response)), ('bytes 7-9/10', b'789'))
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=10-12')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+
+    def test_invalid_range_is_ignored(self):
+        for header in ('bytes=5-3', 'bytes=1-2,4-5', 'items=0-1'):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual((response.status_code, self.body(response)), (200, b'0123456789'), header)
+
+    def test_if_none_match(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        os.utime(self.full_path, (time.time() + 60, time.time() + 60))
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag).status_code, 206)
+        response = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, self.body(response)), (200, b'0123456789'))
+
+    def test_offload_headers(self):
+        with override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.get(HTTP_RANGE='bytes=0-1')
+        self.assertEqual((response.status_code, response.content), (200, b''))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/docs/digits.txt')
+        with override_settings(MEDIA_SENDFILE_HEADER='X-Sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], self.full_path)
+
+
+@isolated_caches
+class ProductBatchTests(TestCase):
+    url = '/texnomart-uz/product/batch/'
+
+    def setUp(self):
+        cache.clear()
+        seed()
+        self.ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+    def batch(self, ids):
+        return self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+
+    def test_results_follow_the_requested_order_without_duplicates(self):
+        ids = [self.ids[5], self.ids[1], self.ids[5], self.ids[3]]
+        response = self.batch(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.ids[5], self.ids[1], self.ids[3]])
+        # Served from the cache the second time, in the same order.
+        self.assertEqual(self.batch(ids).json(), response.json())
+
+    def test_missing_ids_are_reported(self):
+        missing = self.ids[-1] + 1000
+        data = self.client.post(self.url, {'ids': [self.ids[0], missing]}, content_type='application/json').json()
+        self.assertEqual(([item['id'] for item in data['results']], data['not_found']), ([self.ids[0]], [missing]))
+
+    def test_rejects_non_integer_ids_and_oversized_batches(self):
+        self.assertEqual(self.client.get(self.url, {'ids': '1,two'}).status_code, 400)
+        response = self.client.post(self.url, {'ids': '1,2'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        for bad_id in (1.7, 1.0, True, None, '1.5', '-1', [1]):
+            response = self.client.post(self.url, {'ids': [bad_id]}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, bad_id)
+        response = self.client.post(self.url, {'ids': [str(self.ids[0])]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.batch(range(1, 52)).status_code, 400)
+        self.assertEqual(self.batch(self.ids[:50]).status_code, 200)
+
+    def test_popularity_stays_out_of_the_payload(self):
+        item = self.batch(self.ids[:1]).json()['results'][0]
+        self.assertNotIn('popularity', item)
+        self.assertNotIn('popularity', self.client.get(f'/texnomart-uz/product/detail/{self.ids[0]}/').json())
+
+    def test_rejects_a_body_that_is_not_an_object(self):
+        for body in ([1, 2, 3], '1,2', 5):
+            response = self.client.post(self.url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(ALLOWED_HOSTS=['first.example', 'second.example'])
+    def test_cached_image_urls_follow_the_requesting_host(self):
+        ids = ','.join(map(str, self.ids[:2]))
+        self.client.get(self.url, {'ids': ids}, HTTP_HOST='first.example')
+        for path, params in ((self.url, {'ids': ids}), (f'/texnomart-uz/product/detail/{self.ids[0]}/', {})):
+            data = self.client.get(path, params, HTTP_HOST='second.example', secure=True).json()
+            images = [url for item in data.get('results', [data]) for url in item['images']]
+            self.assertTrue(images)
+            self.assertTrue(all(url.startswith('https://second.example/media/') for url in images), images)
+
+    @override_settings(THROTTLE_ENABLED=True)
+    @mock.patch.object(WriteThrottle, 'rate', '2/min', create=True)
+    def test_batch_posts_do_not_spend_the_write_budget(self):
+        caches[THROTTLE_CACHE].clear()
+        for _ in range(3):
+            response = self.client.post(self.url, {'ids': self.ids[:2]}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        counts = []
+        for size in (2, 40):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(self.batch(self.ids[:size]).json()['results']), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@isolated_caches
+@override_settings(METRICS_ENABLED=True)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.addCleanup(self.disable_metrics)
+        AttributeKey.objects.create(key='Color')
+
+    def disable_metrics(self):
+        metrics.enabled = False
+        connection_created.disconnect(dispatch_uid='texnomart_metrics_query_wrapper')
+        if metrics.query_wrapper in connection.execute_wrappers:
+            connection.execute_wrappers.remove(metrics.query_wrapper)
+        metrics.registry.reset()
+
+    def samples(self):
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return dict(line.rsplit(' ', 1) for line in response.content.decode().splitlines()
+                    if not line.startswith('#'))
+
+    def test_requests_queries_and_cache_lookups_are_exported(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/texnomart-uz/attribute-key/').status_code, 200)
+        # Read now: the next request resets the connection's query log.
+        query_count = len(queries)
+        self.assertEqual(self.client.get('/texnomart-uz/attribute-key/').status_code, 200)
+        samples = self.samples()
+
+        labels = 'view="attribute-key",method="GET",status="200"'
+        self.assertEqual(samples[f'texnomart_request_duration_seconds_count{{{labels}}}'], '2')
+        self.assertEqual(samples[f'texnomart_request_duration_seconds_bucket{{{labels},le="+Inf"}}'], '2')
+        # The second request is answered from the cache without touching the database.
+        self.assertGreater(query_count, 0)
+        self.assertEqual(samples['texnomart_db_queries_total{view="attribute-key"}'], str(query_count))
+        self.assertEqual(samples['texnomart_cache_requests_total{family="attribute_keys",result="miss"}'], '1')
+        self.assertEqual(samples['texnomart_cache_requests_total{family="attribute_keys",result="hit"}'], '1')
@@ -0,0 +1,171 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+THROTTLE_CACHE = 'throttle'
+
+
+def check_throttle_cache(app_configs, **kwargs):
+    # Registered in TexnomartConfig.ready(). Each worker would enforce its own budget otherwise.
+    backend = settings.CACHES.get(THROTTLE_CACHE, {}).get('BACKEND', '')
+    if settings.THROTTLE_ENABLED and settings.WEB_WORKERS > 1 and backend.endswith('.LocMemCache'):
+        return [checks.Error(
+            f"The '{THROTTLE_CACHE}' cache is process-local but WEB_WORKERS is {settings.WEB_WORKERS}.",
+            hint='Point it at a shared cache such as Redis or Memcached.',
+            id='texnomart.E001',
+        )]
+    return []
+
+
+class CounterRateThrottle(SimpleRateThrottle):
+    # Sliding-window counter: at most `num_requests` per `duration`, kept as two counters per
+    # identity (this window and the previous one). The previous window counts for the part of
+    # it that still overlaps the last `duration` seconds, which smooths the edges a fixed
+    # window has. A request costs one atomic incr per identity plus one get_many, unlike
+    # SimpleRateThrottle, which reads and rewrites a list of timestamps.
+    # This is not a token bucket: a bucket keeps a token count and a last-refill time that must
+    # change together, which the Django cache API can only do with a lock or a backend script.
+    # incr() alone is atomic on every backend, and the two windows give the same average rate
+    # with a burst of at most num_requests.
+    # Every identity returned by get_idents() has its own counter and all of them must be under
+    # the limit. Rejected requests are counted too, so a client hammering its own IP or account
+    # stays blocked. Identities from get_watched_idents() are only checked here; whoever owns
+    # them counts events with record() (see LoginThrottle).
+    def __init__(self):
+        super().__init__()
+        self.cache = caches[THROTTLE_CACHE]
+        self.wait_seconds = None
+
+    def applies(self, request, view):
+        return True
+
+    def get_idents(self, request, view):
+        idents = [f'ip_{self.get_ident(request)}']
+        if request.user and request.user.is_authenticated:
+            idents.append(f'user_{request.user.pk}')
+        return idents
+
+    def get_watched_idents(self, request, view):
+        return []
+
+    def counter_key(self, ident, window):
+        return f'throttle_{self.scope}_{ident}_{window}'
+
+    def current_window(self):
+        window, offset = divmod(time.time(), self.duration)
+        return int(window), offset
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED or self.rate is None or not self.applies(request, view):
+            return True
+        window, offset = self.current_window()
+        idents = self.get_idents(request, view)
+        watched = self.get_watched_idents(request, view)
+        counts = self.cache.get_many(
+            [self.counter_key(ident, window - 1) for ident in idents + watched]
+            + [self.counter_key(ident, window) for ident in watched]
+        )
+        allowed = True
+        for ident in idents + watched:
+            if ident in watched:
+                # This request would be the next event.
+                current = counts.get(self.counter_key(ident, window), 0) + 1
+            else:
+                current = self.hit(self.counter_key(ident, window))
+            before = counts.get(self.counter_key(ident, window - 1), 0)
+            if before * (1 - offset / self.duration) + current > self.num_requests:
+                allowed = False
+                self.wait_seconds = max(self.wait_seconds or 0, self.time_to_allow(before, current, offset))
+        return allowed
+
+    def hit(self, key):
+        # Counters outlive their window once, so the next window can still read them as `previous`.
+        self.cache.add(key, 0, self.duration * 2)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.set(key, 1, self.duration * 2)
+            return 1
+
+    def record(self, ident):
+        if settings.THROTTLE_ENABLED and self.rate is not None:
+            self.hit(self.counter_key(ident, self.current_window()[0]))
+
+    def reset(self, ident):
+        window = self.current_window()[0]
+        self.cache.delete_many([self.counter_key(ident, window), self.counter_key(ident, window - 1)])
+
+    def time_to_allow(self, before, current, offset):
+        if current <= self.num_requests and before:
+            # The previous window's share shrinks linearly; solve before * overlap + current <= limit.
+            overlap = (self.num_requests - current) / before
+            return max(0, (1 - overlap) * self.duration - offset)
+        # Wait out this window, then for this window's count to fade as the previous one.
+        fade = (1 - self.num_requests / current) * self.duration if current else 0
+        return self.duration - offset + fade
+
+    def wait(self):
+        return None if self.wait_seconds is None else math.ceil(self.wait_seconds)
+
+
+def login_username(request):
+    username = request.data.get('username') if hasattr(request.data, 'get') else None
+    return username if isinstance(username, str) and username else None
+
+
+class LoginThrottle(CounterRateThrottle):
+    # Every attempt counts against the client IP. The attempted username is only charged for
+    # failed logins (LoginAttemptsMixin), so nobody can lock a user out by sending requests in
+    # their name, and a successful login clears it. That still caps guesses at one account
+    # spread over many IPs.
+    scope = 'login'
+
+    def username_ident(self, username):
+        return f"username_{hashlib.sha1(username.casefold().encode()).hexdigest()}"
+
+    def get_watched_idents(self, request, view):
+        username = login_username(request)
+        return [self.username_ident(username)] if username else []
+
+
+class LoginAttemptsMixin:
+    throttle_classes = [LoginThrottle]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        username = login_username(request)
+        if username and response.status_code != 429:
+            throttle = LoginThrottle()
+            if 200 <= response.status_code < 300:
+                throttle.reset(throttle.username_ident(username))
+            elif response.status_code in (400, 401):
+                throttle.record(throttle.username_ident(username))
+        return response
+
+
+class RegisterThrottle(CounterRateThrottle):
+    scope = 'register'
+
+
+class SearchThrottle(CounterRateThrottle):
+    # Only requests that use the SearchFilter parameter.
+    scope = 'search'
+
+    def applies(self, request, view):
+        return bool(request.query_params.get(api_settings.SEARCH_PARAM))
+
+
+class WriteThrottle(CounterRateThrottle):
+    # Views whose POST only reads (ProductBatchView) set read_only = True and are not charged.
+    scope = 'write'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS and not getattr(view, 'read_only', False)
@@ -1,6 +1,6 @@
 from django.urls import path
 from config import custom_obtainviews
-from texnomart.views.texnomart import views
+from texnomart.views.texnomart import views, async_views
 
 urlpatterns = [
 
@@ -15,13 +15,24 @@ urlpatterns = [
 
     # PRODUCTS
     path('product/detail/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('product/batch/', views.ProductBatchView.as_view(), name='product-batch'),
+    path('product/<int:pk>/related/', views.RelatedProductsView.as_view(), name='product-related'),
     path('product/<int:pk>/delete/', views.DeleteProductView.as_view(), name='product-delete'),
     path('product/<int:pk>/edit/', views.EditProductView.as_view(), name='product-edit'),
 
+    # SEARCH
+    path('suggest/', views.SuggestView.as_view(), name='suggest'),
+
     # ATTRIBUTES
     path('attribute-key/', views.AttributeKeyView.as_view(), name='attribute-key'),
     path('attribute-value/', views.AttributeValueView.as_view(), name='attribute-value'),
 
+    # ASYNC (ASGI read path)
+    path('async/', async_views.product_list, name='async-index'),
+    path('async/categories/', async_views.category_list, name='async-categories'),
+    path('async/category/<slug:slug>/', async_views.category_products, name='async-category'),
+    path('async/product/detail/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+
     # auth
     path("login/", custom_obtainviews.LoginView.as_view(), name="user_login"),
     path("register/", custom_obtainviews.RegisterView.as_view(), name="user_register"),
@@ -0,0 +1,153 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, Throttled
+from rest_framework.request import Request
+
+from texnomart.authentication import TokenUserAuthentication
+from texnomart.caching import absolute_image_urls, absolute_product_image_urls, absolute_category_image_urls, \
+    product_detail_cache_key, PRODUCT_DETAIL_TIMEOUT
+from texnomart.categories import category_tree, subtree_products
+from texnomart.metrics import record_cache
+from texnomart.models import Product
+from texnomart.serializers import ProductSerializer, CategorySerializer, ProductDetailSerializer
+from texnomart.throttling import SearchThrottle
+from texnomart.views.texnomart.views import AllProductView, CategoryView, CategoryProductsView, \
+    product_detail_queryset
+
+token_authentication = TokenUserAuthentication()
+
+
+async def authenticate(request):
+    # Both async views are GET-only, so the TokenUser path applies. It still checks the cached
+    # user values, which can fall through to the database on a miss.
+    result = await sync_to_async(token_authentication.authenticate)(request)
+    return result[0] if result else None
+
+
+def error_response(exc):
+    # Same body as DRF's exception_handler: simplejwt's InvalidToken already carries a dict.
+    data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(exc.wait)
+    return response
+
+
+async def check_search_throttle(request, user=None):
+    # These views filter with the same ?search= as the DRF views, so they spend the same budget.
+    throttle = SearchThrottle()
+    drf_request = Request(request)
+    if user is not None:
+        drf_request.user = user
+    if not await sync_to_async(throttle.allow_request)(drf_request, None):
+        raise Throttled(throttle.wait())
+
+
+def filter_queryset(view_class, request, queryset):
+    view = view_class()
+    view.request = Request(request)
+    view.format_kwarg = None
+    return view.filter_queryset(queryset)
+
+
+async def cache_aget_or_set(cache_key, load, timeout):
+    data = await cache.aget(cache_key)
+    record_cache(cache_key, data is not None)
+    if data is None:
+        data = await load()
+        await cache.aset(cache_key, data, timeout=timeout)
+    return data
+
+
+async def liked_product_ids(user, product_ids):
+    if user is None:
+        return set()
+    # Reads the user's likes alone: an id__in over a whole product list outgrows SQLite's
+    # limit on query parameters.
+    liked = {product_id async for product_id in Product.user_likes.through.objects.filter(
+        user_id=user.pk
+    ).values_list('product_id', flat=True)}
+    return liked.intersection(product_ids)
+
+
+async def product_list_payload(request):
+    async def load():
+        queryset = filter_queryset(
+            AllProductView, request, Product.objects.select_related('category').prefetch_related('images')
+        )
+        products = [product async for product in queryset]
+        return ProductSerializer(products, many=True).data
+
+    if request.GET:
+        return await load()
+    return await cache_aget_or_set('all_products_payload', load, timeout=60 * 11)
+
+
+@require_GET
+async def product_list(request):
+    try:
+        user = await authenticate(request)
+        if user is not None:
+            await check_search_throttle(request, user)
+    except APIException as exc:
+        return error_response(exc)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    data = absolute_product_image_urls(await product_list_payload(request), request)
+    liked = await liked_product_ids(user, [item['id'] for item in data])
+    return JsonResponse([dict(item, user_likes=item['id'] in liked) for item in data], safe=False)
+
+
+@require_GET
+async def category_list(request):
+    async def load():
+        categories = [category async for category in CategoryView.queryset.all()]
+        return category_tree(CategorySerializer(categories, many=True).data)
+
+    data = await cache_aget_or_set('category_list_payload', load, timeout=60 * 15)
+    return JsonResponse(absolute_category_image_urls(data, request), safe=False)
+
+
+@require_GET
+async def category_products(request, slug):
+    try:
+        await check_search_throttle(request)
+    except APIException as exc:
+        return error_response(exc)
+
+    async def load():
+        queryset = filter_queryset(
+            CategoryProductsView, request, subtree_products(CategoryProductsView.queryset, slug)
+        )
+        products = [product async for product in queryset]
+        return ProductSerializer(products, many=True).data
+
+    if request.GET:
+        data = await load()
+    else:
+        data = await cache_aget_or_set(f'category_products_payload_{slug}', load, timeout=60 * 15)
+    return JsonResponse(absolute_product_image_urls(data, request), safe=False)
+
+
+@require_GET
+async def product_detail(request, pk):
+    try:
+        user = await authenticate(request)
+    except APIException as exc:
+        return error_response(exc)
+
+    cache_key = product_detail_cache_key(pk)
+    data = await cache.aget(cache_key)
+    record_cache(cache_key, data is not None)
+    if data is None:
+        product = await product_detail_queryset().filter(pk=pk).afirst()
+        if not product:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+        data = ProductDetailSerializer(product).data
+        await cache.aset(cache_key, data, timeout=PRODUCT_DETAIL_TIMEOUT)
+
+    return JsonResponse(dict(absolute_image_urls(data, request),
+                             user_likes=pk in await liked_product_ids(user, [pk])))
@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from django.core.cache import cache
-from django.db.models import Prefetch, Avg, Count, Sum
+from django.db.models import Prefetch, Avg
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework import status
@@ -10,34 +10,44 @@ from rest_framework.generics import GenericAPIView, CreateAPIView, ListCreateAPI
     get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from texnomart.authentication import TokenUserAuthentication
+from texnomart.caching import absolute_image_urls, product_detail_cache_key, PRODUCT_DETAIL_TIMEOUT
+from texnomart.categories import categories_with_totals, category_tree, subtree_products
+from texnomart.deletion import delete_categories, delete_products
+from texnomart.metrics import record_cache
 from texnomart.models import Product, Category, Image, Comment, AttributeKey, AttributeValue
 from texnomart.permissions import IsSuperAdminOrReadOnly
+from texnomart.suggest import suggester
 from texnomart.serializers import ProductSerializer, CategorySerializer, ProductDetailSerializer, \
     AttributeKeySerializer, AttributeValueSerializer
 
 
 def cache_get_or_set(cache_key, queryset, timeout=60 * 11):
     cached_data = cache.get(cache_key)
+    record_cache(cache_key, cached_data is not None)
     if cached_data is not None:
         return cached_data
     cache.set(cache_key, queryset, timeout=timeout)
     return queryset
 
 
+PRODUCT_ORDERING_FIELDS = ['id', 'name', 'slug', 'price', 'discount', 'created_at', 'popularity']
+
+
+def all_products_queryset():
+    return cache_get_or_set('all_products', Product.objects.select_related('category').prefetch_related('images'))
+
+
 class AllProductView(ListAPIView):
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', ]
-    authentication_classes = [JWTAuthentication]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
+    authentication_classes = [TokenUserAuthentication]
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
-        cache_key = 'all_products'
-        queryset = cache_get_or_set(
-            cache_key,
-            Product.objects.select_related('category').prefetch_related('images')
-        )
+        queryset = all_products_queryset()
 
         if self.request.user.is_authenticated:
             user_likes = Prefetch(
@@ -50,17 +60,17 @@ class AllProductView(ListAPIView):
 
 
 class CategoryView(GenericAPIView):
-    queryset = Category.objects.annotate(products_count=Count('products'), products_price_sum=Sum('products__price'))
+    queryset = categories_with_totals()
     serializer_class = CategorySerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', ]
-    authentication_classes = [JWTAuthentication, TokenAuthentication]
+    authentication_classes = [TokenUserAuthentication, TokenAuthentication]
 
     def get(self, request, *args, **kwargs):
         cache_key = 'category_list'
         data = cache_get_or_set(cache_key, self.get_queryset(), timeout=60 * 15)
         serializer = self.get_serializer(data, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(category_tree(serializer.data))
 
 
 class AddCategoryView(CreateAPIView):
@@ -104,7 +114,7 @@ class DeleteCategoryView(GenericAPIView):
 
     def delete(self, request, *args, **kwargs):
         category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        category.delete()
+        delete_categories([category.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -115,7 +125,7 @@ class EditCategoryView(RetrieveUpdateAPIView):
 
     def delete(self, request, *args, **kwargs):
         category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        category.delete()
+        delete_categories([category.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -127,53 +137,159 @@ class CategoryProductsView(GenericAPIView):
     lookup_field = 'slug'
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', ]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
 
     def get(self, request, *args, **kwargs):
         category_slug = self.kwargs['slug']
         cache_key = f'category_products_{category_slug}'
-        products = cache_get_or_set(cache_key, self.queryset.filter(category__slug=category_slug), timeout=60 * 15)
+        products = cache_get_or_set(cache_key, subtree_products(self.queryset, category_slug), timeout=60 * 15)
+        products = self.filter_queryset(products)
         serializer = self.serializer_class(products, many=True, context={'request': request})
         return Response(serializer.data)
 
 
-class ProductDetailView(GenericAPIView):
-    queryset = Product.objects.prefetch_related(
+def product_detail_queryset():
+    return Product.objects.prefetch_related(
         Prefetch('images', queryset=Image.objects.filter(is_primary=True)),
         Prefetch('comments', queryset=Comment.objects.select_related('user')),
-        Prefetch('attributes', queryset=AttributeKey.objects.select_related('key').select_related('value'))
     ).annotate(rating=Avg('comments__rating'))
+
+
+def liked_product_ids(user, product_ids):
+    if not user.is_authenticated:
+        return set()
+    # Filters on the user id only, so a TokenUser works as well as a User, and intersects in
+    # Python so a full product list never becomes an id__in with one parameter per product.
+    liked = Product.user_likes.through.objects.filter(user_id=user.pk).values_list('product_id', flat=True)
+    return set(liked).intersection(product_ids)
+
+
+class ProductDetailView(GenericAPIView):
     serializer_class = ProductDetailSerializer
 
+    def get_queryset(self):
+        return product_detail_queryset()
+
     def get(self, request, *args, **kwargs):
         product_id = self.kwargs.get('pk')
-        product = self.get_queryset().filter(pk=product_id).first()
+        cache_key = product_detail_cache_key(product_id)
+        data = cache.get(cache_key)
+        record_cache(cache_key, data is not None)
 
-        if not product:
-            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        if data is None:
+            product = self.get_queryset().filter(pk=product_id).first()
+            if not product:
+                return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            data = self.serializer_class(product).data
+            cache.set(cache_key, data, timeout=PRODUCT_DETAIL_TIMEOUT)
+
+        data = dict(absolute_image_urls(data, request),
+                    user_likes=product_id in liked_product_ids(request.user, [product_id]))
+        return Response(data)
+
+
+def is_product_id(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value.isascii() and value.isdigit()
+    return isinstance(value, int) and not isinstance(value, bool)
 
-        serializer = self.get_serializer(product)
-        return Response(serializer.data)
+
+class ProductBatchView(GenericAPIView):
+    serializer_class = ProductDetailSerializer
+    max_ids = 50
+    # POST is only there for id lists too long for a query string; WriteThrottle skips it.
+    read_only = True
+
+    def get_queryset(self):
+        return product_detail_queryset()
+
+    def get(self, request, *args, **kwargs):
+        ids = request.query_params.get('ids', '')
+        return self.batch_response([product_id for product_id in ids.split(',') if product_id.strip()])
+
+    def post(self, request, *args, **kwargs):
+        ids = request.data.get('ids', []) if isinstance(request.data, dict) else None
+        if not isinstance(ids, list):
+            return Response({'ids': 'Expected a list of product ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.batch_response(ids)
+
+    def batch_response(self, raw_ids):
+        # int() alone would take 1.7 and true as product 1.
+        if not all(is_product_id(product_id) for product_id in raw_ids):
+            return Response({'ids': 'Product ids must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        product_ids = list(dict.fromkeys(int(product_id) for product_id in raw_ids))
+        if len(product_ids) > self.max_ids:
+            return Response({'ids': f'At most {self.max_ids} products can be requested at once.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cache_keys = {product_id: product_detail_cache_key(product_id) for product_id in product_ids}
+        cached = cache.get_many(cache_keys.values())
+        found = {product_id: cached[key] for product_id, key in cache_keys.items() if key in cached}
+        for product_id, key in cache_keys.items():
+            record_cache(key, product_id in found)
+
+        missing_ids = [product_id for product_id in product_ids if product_id not in found]
+        if missing_ids:
+            products = self.get_queryset().filter(pk__in=missing_ids)
+            fresh = {item['id']: item for item in self.serializer_class(products, many=True).data}
+            cache.set_many({cache_keys[product_id]: item for product_id, item in fresh.items()},
+                           timeout=PRODUCT_DETAIL_TIMEOUT)
+            found.update(fresh)
+
+        liked = liked_product_ids(self.request.user, list(found))
+        return Response({
+            'results': [dict(absolute_image_urls(found[product_id], self.request),
+                             user_likes=product_id in liked)
+                        for product_id in product_ids if product_id in found],
+            'not_found': [product_id for product_id in product_ids if product_id not in found],
+        })
+
+
+class RelatedProductsView(ListAPIView):
+    serializer_class = ProductSerializer
+    max_results = 12
+
+    def get_queryset(self):
+        return Product.objects.filter(recommended_for__product_id=self.kwargs['pk']).select_related(
+            'category'
+        ).prefetch_related(
+            Prefetch('images', queryset=Image.objects.filter(is_primary=True))
+        ).order_by('-recommended_for__score')[:self.max_results]
+
+
+class SuggestView(GenericAPIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
+        return Response(suggester.suggest(request.query_params.get('q', ''), limit))
 
 
 class DeleteProductView(GenericAPIView):
     def get(self, request, *args, **kwargs):
-        product = get_object_or_404(Product, id=self.kwargs['pk'])
+        product = get_object_or_404(Product.objects.select_related('category').prefetch_related('images'),
+                                    id=self.kwargs['pk'])
         serializer = ProductSerializer(product, context={'request': request})
         return Response(serializer.data)
 
     def delete(self, request, *args, **kwargs):
         product = get_object_or_404(Product, id=self.kwargs['pk'])
-        product.delete()
+        delete_products([product.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class EditProductView(RetrieveUpdateAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category').prefetch_related('images')
     serializer_class = ProductSerializer
 
     def delete(self, request, *args, **kwargs):
         product = get_object_or_404(Product, id=self.kwargs['pk'])
-        product.delete()
+        delete_products([product.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 